@@ -6,8 +6,14 @@ import logging
 import requests
 import json
 import sys
+import threading
 from datetime import datetime
 
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
 # ========= LOAD CONFIG =========
 def load_config():
     with open("config.json", "r") as f:
@@ -30,10 +36,15 @@ INPUT_DIR = config["inputDir"]
 OUTPUT_DIR = config["outputDir"]
 LOG_FILE = config["logFile"]
 POLL_INTERVAL = config["pollIntervalSeconds"]
+MAX_CONCURRENT_JOBS = int(config.get("maxConcurrentJobs", 1))
+WATCH_EVENTS = config.get("watchEvents", True)
+FILE_STABLE_SECONDS = config.get("fileStableSeconds", 2)
+MAX_POLL_FAILURES = int(config.get("maxPollFailures", 60))
 
 # ========= CONSTANTS =========
 CSV_TYPE = "SINGLE_ROW_PER_OBJ"
 ATOMIC = True
+JOB_POLL_INTERVAL = 5
 
 # ========= LOGGING =========
 logging.basicConfig(
@@ -88,87 +99,321 @@ def create_import_job(token, file_id):
         logging.error(f"Job creation error: {e}")
         return None
 
+def check_job(token, job_id, base_filename, timestamp):
+    """Poll the job once; save its report and return True when it has finished."""
+    headers = {'X-OS-API-TOKEN': token}
+    response = requests.get(f"{URL}/import-jobs/{job_id}", headers=headers)
+    response.raise_for_status()
+    status = response.json().get("status")
+
+    if status == "FAILED":
+        report = requests.get(f"{URL}/import-jobs/{job_id}/output", headers=headers).content
+        output_file = os.path.join(OUTPUT_DIR, f"{base_filename}_FAILED_{timestamp}.csv")
+        with open(output_file, 'wb') as f:
+            f.write(report)
+        logging.info(f"Job FAILED. Report saved as: {output_file}")
+        return True
+
+    elif status == "COMPLETED":
+        report = requests.get(f"{URL}/import-jobs/{job_id}/output", headers=headers).content
+        output_file = os.path.join(OUTPUT_DIR, f"{base_filename}_SUCCESS_{timestamp}.csv")
+        with open(output_file, 'wb') as f:
+            f.write(report)
+        logging.info(f"Job SUCCESS. Report saved as: {output_file}")
+        return True
+
+    elif status == "IN_PROGRESS":
+        return False
+    else:
+        logging.warning(f"Unknown status for job {job_id}: {status}")
+        return True
+
 def monitor_job(token, job_id, base_filename):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     try:
-        headers = {'X-OS-API-TOKEN': token}
-        while True:
-            response = requests.get(f"{URL}/import-jobs/{job_id}", headers=headers)
-            response.raise_for_status()
-            status = response.json().get("status")
-
-            if status == "FAILED":
-                report = requests.get(f"{URL}/import-jobs/{job_id}/output", headers=headers).content
-                output_file = os.path.join(OUTPUT_DIR, f"{base_filename}_FAILED_{timestamp}.csv")
-                with open(output_file, 'wb') as f:
-                    f.write(report)
-                logging.info(f"Job FAILED. Report saved as: {output_file}")
-                break
-
-            elif status == "COMPLETED":
-                report = requests.get(f"{URL}/import-jobs/{job_id}/output", headers=headers).content
-                output_file = os.path.join(OUTPUT_DIR, f"{base_filename}_SUCCESS_{timestamp}.csv")
-                with open(output_file, 'wb') as f:
-                    f.write(report)
-                logging.info(f"Job SUCCESS. Report saved as: {output_file}")
-                break
-
-            elif status == "IN_PROGRESS":
-                time.sleep(5)
-            else:
-                logging.warning(f"Unknown status for job {job_id}: {status}")
-                break
+        while not check_job(token, job_id, base_filename, timestamp):
+            time.sleep(JOB_POLL_INTERVAL)
     except Exception as e:
         logging.error(f"Error monitoring job {job_id}: {e}")
 
-# ========= FOLDER SCAN =========
-def get_next_file():
-    os.makedirs(INPUT_DIR, exist_ok=True)
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+def submit_file(file_path):
+    """Start a session, upload the file and create its import job. Returns (token, job_id) or None."""
+    logging.info(f"Processing file: {file_path}")
+
+    token = start_session()
+    if not token:
+        logging.error("No token received. Skipping file.")
+        return None
+
+    file_id = upload_file(token, file_path)
+    if not file_id:
+        logging.error("File upload failed. Skipping.")
+        return None
+
+    job_id = create_import_job(token, file_id)
+    if not job_id:
+        logging.error("Job creation failed. Skipping.")
+        return None
+
+    return token, job_id
+
+def remove_input_file(file_path):
+    # ✅ Delete the file after processing
+    try:
+        os.remove(file_path)
+        logging.info(f"Deleted input file: {file_path}")
+    except Exception as e:
+        logging.error(f"Failed to delete {file_path}: {e}")
+
+# ========= FOLDER WATCH =========
+class CsvEventHandler:
+    """Forward watchdog events for CSV files to the FolderWatcher."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def dispatch(self, event):
+        if event.is_directory:
+            return
+        if event.event_type == "closed":
+            self.watcher.mark_ready(event.src_path)
+        elif event.event_type in ("created", "modified"):
+            self.watcher.note(event.src_path)
+        elif event.event_type == "moved":
+            self.watcher.forget(event.src_path)
+            self.watcher.mark_ready(event.dest_path)
+        elif event.event_type == "deleted":
+            self.watcher.forget(event.src_path)
+
+class FolderWatcher:
+    """
+    Track the CSV files in a folder and hand out the ones ready to import.
+
+    With watchdog (inotify on Linux) a file is ready as soon as its writer
+    closes it or it is renamed into the folder, and the folder is never
+    listed again after startup. Without it, or if the observer cannot start,
+    the folder is listed every POLL_INTERVAL. Files seen any other way are
+    ready once their mtime is FILE_STABLE_SECONDS old and their size has
+    stopped changing.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        self.directory = os.path.abspath(directory)
+        self.cond = threading.Condition()
+        self.ready = set()
+        self.pending = {}
+        self.changed = False
+        self.observer = None
+        self.next_scan = 0
+
+        if WATCH_EVENTS and Observer is not None:
+            try:
+                observer = Observer()
+                observer.schedule(CsvEventHandler(self), self.directory, recursive=False)
+                observer.daemon = True
+                observer.start()
+                self.observer = observer
+                logging.info(f"Watching {self.directory} for new files.")
+            except Exception as e:
+                logging.warning(f"Folder events unavailable ({e}); polling every {POLL_INTERVAL}s.")
+        else:
+            logging.info(f"Polling {self.directory} every {POLL_INTERVAL}s.")
+
+        # Pick up what was already waiting (after the observer started, so nothing is missed)
+        self.scan()
+
+    def is_csv(self, path):
+        return path.endswith(".csv") and os.path.dirname(os.path.abspath(path)) == self.directory
+
+    def note(self, path):
+        """A file was created or written to; wait until it is stable."""
+        if not self.is_csv(path):
+            return
+        with self.cond:
+            path = os.path.abspath(path)
+            self.ready.discard(path)
+            self.pending.setdefault(path, None)
+            self.changed = True
+            self.cond.notify_all()
+
+    def mark_ready(self, path):
+        if not self.is_csv(path):
+            return
+        with self.cond:
+            path = os.path.abspath(path)
+            self.pending.pop(path, None)
+            self.ready.add(path)
+            self.changed = True
+            self.cond.notify_all()
+
+    def forget(self, path):
+        with self.cond:
+            path = os.path.abspath(path)
+            self.pending.pop(path, None)
+            self.ready.discard(path)
 
-    files = sorted([
-        os.path.join(INPUT_DIR, f)
-        for f in os.listdir(INPUT_DIR)
-        if f.endswith(".csv")
-    ])
-    return files[0] if files else None
+    def scan(self):
+        with self.cond:
+            files = {os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".csv")}
+            for path in (self.ready | set(self.pending)) - files:
+                self.forget(path)
+            for path in files - self.ready:
+                self.pending.setdefault(path, None)
+            self.next_scan = time.monotonic() + POLL_INTERVAL
+
+    def promote_stable(self):
+        """Move pending files whose size and mtime have settled to ready. Returns seconds until the next check."""
+        next_check = None
+        now = time.time()
+        for path, last_size in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+
+            age = now - stat.st_mtime
+            if stat.st_size == last_size and age >= FILE_STABLE_SECONDS:
+                del self.pending[path]
+                self.ready.add(path)
+                self.changed = True
+                continue
+
+            self.pending[path] = stat.st_size
+            wait = max(FILE_STABLE_SECONDS - age, 0.1)
+            next_check = wait if next_check is None else min(next_check, wait)
+        return next_check
+
+    def next_file(self, skip=()):
+        """Return the first ready file by name, leaving out the ones in skip."""
+        with self.cond:
+            self.promote_stable()
+            self.ready = {path for path in self.ready if os.path.exists(path)}
+            files = sorted(self.ready - set(skip))
+            return files[0] if files else None
+
+    def wait(self, timeout):
+        """Sleep up to timeout seconds, waking early when a file may have become ready."""
+        with self.cond:
+            next_check = self.promote_stable()
+            if not self.changed:
+                if next_check is not None:
+                    timeout = min(timeout, next_check)
+                if self.observer is None:
+                    timeout = min(timeout, max(self.next_scan - time.monotonic(), 0))
+                self.cond.wait(timeout)
+            self.changed = False
+
+            if self.observer is None and time.monotonic() >= self.next_scan:
+                self.scan()
+
+# ========= CONCURRENT JOBS =========
+class ActiveJob:
+    """An import job that has been submitted and is waiting for the poller."""
+
+    def __init__(self, file_path, token, job_id):
+        self.file_path = file_path
+        self.base_filename = os.path.splitext(os.path.basename(file_path))[0]
+        self.token = token
+        self.job_id = job_id
+        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.poll_failures = 0
+
+def fill_job_slots(watcher, active, max_jobs):
+    """Submit the oldest waiting files until max_jobs jobs are in flight."""
+    attempted = set()
+    while len(active) < max_jobs:
+        in_flight = {job.file_path for job in active.values()}
+        file_path = watcher.next_file(in_flight | attempted)
+        if not file_path:
+            break
+
+        # A file that could not be submitted is retried on the next pass
+        attempted.add(file_path)
+        submitted = submit_file(file_path)
+        if submitted:
+            token, job_id = submitted
+            active[job_id] = ActiveJob(file_path, token, job_id)
+            logging.info(f"Job {job_id} submitted for {file_path} ({len(active)}/{max_jobs} in flight)")
+
+def set_aside_input_file(job):
+    """Move the input of a job that can no longer be tracked to the output folder instead of deleting it."""
+    target = os.path.join(OUTPUT_DIR, f"{job.base_filename}_UNTRACKED_{job.timestamp}.csv")
+    try:
+        os.replace(job.file_path, target)
+        logging.error(f"Gave up on job {job.job_id}; moved {job.file_path} to {target}")
+    except Exception as e:
+        logging.error(f"Failed to move {job.file_path} aside: {e}")
+
+def poll_active_jobs(active):
+    """
+    Check every in-flight job once and retire the finished ones. A job that cannot
+    be checked (network error, server restart) stays in flight with a fresh session
+    for the next poll; after MAX_POLL_FAILURES failures in a row it is dropped and
+    its input file is set aside, since no report was saved for it.
+    """
+    for job_id, job in list(active.items()):
+        try:
+            done = check_job(job.token, job_id, job.base_filename, job.timestamp)
+            job.poll_failures = 0
+        except Exception as e:
+            job.poll_failures += 1
+            logging.error(f"Error monitoring job {job_id} ({job.poll_failures}/{MAX_POLL_FAILURES}): {e}")
+            if job.poll_failures >= MAX_POLL_FAILURES:
+                del active[job_id]
+                set_aside_input_file(job)
+            else:
+                job.token = start_session() or job.token
+            continue
+
+        if done:
+            del active[job_id]
+            remove_input_file(job.file_path)
+
+def run_concurrent(watcher, max_jobs):
+    active = {}
+    next_poll = 0
+    while True:
+        fill_job_slots(watcher, active, max_jobs)
+        if not active:
+            watcher.wait(POLL_INTERVAL)
+            next_poll = time.monotonic() + JOB_POLL_INTERVAL
+            continue
+
+        # A file landing before the next poll can take a free slot right away
+        remaining = next_poll - time.monotonic()
+        if remaining > 0:
+            watcher.wait(remaining)
+            continue
+
+        poll_active_jobs(active)
+        next_poll = time.monotonic() + JOB_POLL_INTERVAL
 
 # ========= MAIN =========
 def main():
     logging.info("Monitoring started.")
     try:
+        watcher = FolderWatcher(INPUT_DIR)
+        if MAX_CONCURRENT_JOBS > 1:
+            logging.info(f"Running up to {MAX_CONCURRENT_JOBS} import jobs at a time.")
+            run_concurrent(watcher, MAX_CONCURRENT_JOBS)
+
         while True:
-            file_path = get_next_file()
+            file_path = watcher.next_file()
             if not file_path:
-                time.sleep(POLL_INTERVAL)
+                watcher.wait(POLL_INTERVAL)
                 continue
 
             base_filename = os.path.splitext(os.path.basename(file_path))[0]
-            logging.info(f"Processing file: {file_path}")
-
-            token = start_session()
-            if not token:
-                logging.error("No token received. Skipping file.")
-                continue
-
-            file_id = upload_file(token, file_path)
-            if not file_id:
-                logging.error("File upload failed. Skipping.")
-                continue
-
-            job_id = create_import_job(token, file_id)
-            if not job_id:
-                logging.error("Job creation failed. Skipping.")
+            submitted = submit_file(file_path)
+            if not submitted:
                 continue
 
+            token, job_id = submitted
             monitor_job(token, job_id, base_filename)
-
-            # ✅ Delete the file after processing
-            try:
-                os.remove(file_path)
-                logging.info(f"Deleted input file: {file_path}")
-            except Exception as e:
-                logging.error(f"Failed to delete {file_path}: {e}")
+            remove_input_file(file_path)
 
     except KeyboardInterrupt:
         logging.info("Monitoring stopped by user.")
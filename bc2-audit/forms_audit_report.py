@@ -1,15 +1,24 @@
 import sys
 import os
+import argparse
 import logging
+import queue
+import threading
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 import csv
-from datetime import datetime, timedelta
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 import calendar
 import smtplib
 from email.message import EmailMessage
 from email.utils import formatdate
 
+# The attachment splitter is shared with the other report mailers at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from reportAttachments import ATTACHMENT_TYPES, package_report
+
 os.makedirs("logs", exist_ok=True)
 # Format log filename
 log_filename = datetime.today().strftime("script_%Y-%m-%d.log")
@@ -62,18 +71,19 @@ def connect_db(config):
         logging.error(f"Error connecting to MySQL: {e}")
         sys.exit(1)
 
+FORM_IDS_QUERY = """
+    SELECT DISTINCT(container_id) AS form_id
+    FROM catissue_form_context ctxt
+    INNER JOIN os_cp_group_cps cp_group ON ctxt.cp_id = cp_group.cp_id
+    WHERE cp_group.group_id = 1
+    AND ctxt.deleted_on IS NULL
+    AND ctxt.entity_type = 'Specimen'
+"""
+
 def get_form_ids(connection):
-    query = """
-        SELECT DISTINCT(container_id) AS form_id
-        FROM catissue_form_context ctxt
-        INNER JOIN os_cp_group_cps cp_group ON ctxt.cp_id = cp_group.cp_id
-        WHERE cp_group.group_id = 1
-        AND ctxt.deleted_on IS NULL
-        AND ctxt.entity_type = 'Specimen'
-    """
     try:
         cursor = connection.cursor()
-        cursor.execute(query)
+        cursor.execute(FORM_IDS_QUERY)
         rows = cursor.fetchall()
         form_ids = [row[0] for row in rows]
         logging.info(f"Retrieved {len(form_ids)} form IDs.")
@@ -84,90 +94,405 @@ def get_form_ids(connection):
     finally:
         cursor.close()
 
-def fetch_form_audits(form_ids, connection):
-    # Calculate last month range
+# The audit join, restricted either to one form (per_form engine) or to every
+# form from FORM_IDS_QUERY at once (set engine). The *_PARTIAL_QUERY variants
+# lead with the form id so the rows can be cached per form and month.
+AUDIT_QUERY_TEMPLATE = """
+    SELECT{form_column}
+        audit.record_id AS "Record Id",
+        forms.caption AS "Form Name",
+        MIN(audit.event_timestamp) AS "Created On",
+        MIN(CONCAT(usr1.first_name, ' ', usr1.last_name)) AS "Created By",
+        MAX(entry.update_time) as "Last Updated On",
+        MAX(CONCAT(usr2.first_name, ' ', usr2.last_name)) AS "Last Updated By"
+    FROM
+        dyextn_audit_events audit{form_join}
+        JOIN catissue_user usr1 ON audit.user_id = usr1.identifier
+        JOIN dyextn_containers forms ON audit.form_id = forms.identifier
+        JOIN catissue_form_record_entry entry ON audit.record_id = entry.record_id
+        JOIN catissue_user usr2 ON entry.updated_by = usr2.identifier
+    WHERE
+        audit.event_type = 'UPDATE'
+        AND audit.event_timestamp >= %s
+        AND audit.event_timestamp <= %s{form_filter}
+        AND entry.activity_status != 'CLOSED'
+    GROUP BY{form_column}
+        audit.record_id,
+        forms.caption
+"""
+
+PER_FORM_FILTER = dict(
+    form_join="",
+    form_filter="\n        AND audit.form_id = %s"
+)
+
+SET_FILTER = dict(
+    form_join=f"\n        JOIN ({FORM_IDS_QUERY}) form_ids ON audit.form_id = form_ids.form_id",
+    form_filter=""
+)
+
+AUDIT_QUERY = AUDIT_QUERY_TEMPLATE.format(form_column="", **PER_FORM_FILTER)
+SET_AUDIT_QUERY = AUDIT_QUERY_TEMPLATE.format(form_column="", **SET_FILTER)
+AUDIT_PARTIAL_QUERY = AUDIT_QUERY_TEMPLATE.format(form_column="\n        audit.form_id,", **PER_FORM_FILTER)
+SET_AUDIT_PARTIAL_QUERY = AUDIT_QUERY_TEMPLATE.format(form_column="\n        audit.form_id,", **SET_FILTER)
+
+AUDIT_ENGINES = ('per_form', 'set')
+
+# Rows fetched per round trip by the parallel workers, and how many of those
+# batches a worker may buffer ahead of the writer before it has to wait.
+FETCH_BATCH_SIZE = 1000
+QUEUED_BATCHES = 8
+
+def last_month_range():
     today = datetime.today()
-    first_day_this_month = datetime(today.year, today.month, 1)
+    first_day_this_month = date(today.year, today.month, 1)
     last_month_last_day = first_day_this_month - timedelta(days=1)
-    last_month_first_day = datetime(last_month_last_day.year, last_month_last_day.month, 1)
+    return date(last_month_last_day.year, last_month_last_day.month, 1), last_month_last_day
 
-    start_date_str = last_month_first_day.strftime("%Y-%m-%d 00:00:00")
-    end_date_str = last_month_last_day.strftime("%Y-%m-%d 23:59:59")
-    month_str = last_month_first_day.strftime("%b").lower()
-    year_str = last_month_first_day.strftime("%Y")
-    filename = f"forms_audit_for_{month_str}_{year_str}.csv"
+def is_whole_month(first_day, last_day):
+    return (first_day.day == 1 and first_day.year == last_day.year and first_day.month == last_day.month
+            and last_day.day == calendar.monthrange(last_day.year, last_day.month)[1])
 
-    logging.info(f"Fetching audit logs from {start_date_str} to {end_date_str}")
-    logging.info(f"Writing results to {filename}")
+def report_period(first_day, last_day):
+    """Return the (file name, label) of the report covering first_day to last_day."""
+    if is_whole_month(first_day, last_day):
+        month_str = first_day.strftime("%b").lower()
+        year_str = first_day.strftime("%Y")
+        return f"forms_audit_for_{month_str}_{year_str}.csv", first_day.strftime("%B %Y")
+    return (f"forms_audit_{first_day:%Y-%m-%d}_to_{last_day:%Y-%m-%d}.csv",
+            f"{first_day:%Y-%m-%d} to {last_day:%Y-%m-%d}")
 
-    query = """
-        SELECT
-            audit.record_id AS "Record Id",
-            forms.caption AS "Form Name",
-            MIN(audit.event_timestamp) AS "Created On",
-            MIN(CONCAT(usr1.first_name, ' ', usr1.last_name)) AS "Created By",
-            MAX(entry.update_time) as "Last Updated On",
-            MAX(CONCAT(usr2.first_name, ' ', usr2.last_name)) AS "Last Updated By"
-        FROM
-            dyextn_audit_events audit
-            JOIN catissue_user usr1 ON audit.user_id = usr1.identifier
-            JOIN dyextn_containers forms ON audit.form_id = forms.identifier
-            JOIN catissue_form_record_entry entry ON audit.record_id = entry.record_id
-            JOIN catissue_user usr2 ON entry.updated_by = usr2.identifier
-        WHERE
-            audit.event_type = 'UPDATE'
-            AND audit.event_timestamp >= %s
-            AND audit.event_timestamp <= %s
-            AND audit.form_id = %s
-            AND entry.activity_status != 'CLOSED'
-        GROUP BY
-            audit.record_id,
-            forms.caption
+def audit_window(first_day, last_day):
+    return first_day.strftime("%Y-%m-%d 00:00:00"), last_day.strftime("%Y-%m-%d 23:59:59")
+
+def write_audits_serial(writer, form_ids, connection, window, query=AUDIT_QUERY):
+    row_count = 0
+    cursor = connection.cursor()
+    try:
+        for index, form_id in enumerate(form_ids):
+            cursor.execute(query, (*window, form_id))
+            rows = cursor.fetchall()
+            if index == 0:
+                writer.writerow([desc[0] for desc in cursor.description])
+
+            writer.writerows(rows)
+            row_count += len(rows)
+    finally:
+        cursor.close()
+    return row_count
+
+def create_pool(config, size):
+    try:
+        return pooling.MySQLConnectionPool(
+            pool_name="forms_audit",
+            pool_size=size,
+            host=config.get('hostname'),
+            port=int(config.get('port', 3306)),
+            user=config.get('user_name'),
+            password=config.get('password'),
+            database=config.get('database')
+        )
+    except Error as e:
+        logging.error(f"Error creating MySQL connection pool: {e}")
+        sys.exit(1)
+
+def query_form_audits(pool, form_id, window, out, cancelled, query):
+    """
+    Run the audit query for one form on a pooled connection and push the
+    column names, then batches of rows, then None onto out. An exception is
+    pushed instead of None so the writer can fail the report.
     """
+    def put(item):
+        while not cancelled.is_set():
+            try:
+                out.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
 
+    if cancelled.is_set():
+        return
     try:
-        with open(filename, mode='w', newline='') as file:
-            writer = None
-            row_count = 0
+        connection = pool.get_connection()
+        try:
             cursor = connection.cursor()
-            for form_id in form_ids:
-                cursor.execute(query, (start_date_str, end_date_str, form_id))
-                rows = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
+            try:
+                cursor.execute(query, (*window, form_id))
+                if not put([desc[0] for desc in cursor.description]):
+                    return
+                while True:
+                    rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                    if not rows:
+                        break
+                    if not put(rows):
+                        return
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+        put(None)
+    except Exception as e:
+        put(e)
+
+def next_batch(out):
+    item = out.get()
+    if isinstance(item, Exception):
+        raise item
+    return item
+
+def write_audits_parallel(writer, form_ids, pool, window, workers, query=AUDIT_QUERY):
+    """
+    Run the per-form queries on workers connections from pool and write the
+    rows in form id order. Each form streams into its own bounded queue and
+    the writer drains them in order, so the file matches the serial report.
+
+    Forms are started in order, so the form the writer is waiting on is always
+    running or finished; workers blocked on later, full queues cannot stall it.
+    """
+    queues = [queue.Queue(maxsize=QUEUED_BATCHES) for _ in form_ids]
+    cancelled = threading.Event()
+    row_count = 0
 
-                if writer is None:
-                    writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for form_id, out in zip(form_ids, queues):
+            executor.submit(query_form_audits, pool, form_id, window, out, cancelled, query)
+
+        try:
+            for index, (form_id, out) in enumerate(zip(form_ids, queues)):
+                columns = next_batch(out)
+                if index == 0:
                     writer.writerow(columns)
 
-                for row in rows:
-                    writer.writerow(row)
-                    row_count += 1
+                form_rows = 0
+                while True:
+                    rows = next_batch(out)
+                    if rows is None:
+                        break
+                    writer.writerows(rows)
+                    form_rows += len(rows)
+
+                logging.debug(f"Form {form_id}: {form_rows} rows")
+                row_count += form_rows
+        finally:
+            # Unblock and stop the remaining workers if the report failed
+            cancelled.set()
+
+    return row_count
+
+def write_audits_set(writer, connection, window, query=SET_AUDIT_QUERY):
+    """
+    Run one audit query over every form and stream it to the writer in
+    FETCH_BATCH_SIZE batches from an unbuffered cursor, so client memory stays
+    flat however long the window is. The connection cannot run anything else
+    until the result set has been read to the end.
+    """
+    row_count = 0
+    cursor = connection.cursor(buffered=False)
+    try:
+        cursor.execute(query, window)
+        writer.writerow([desc[0] for desc in cursor.description])
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+            writer.writerows(rows)
+            row_count += len(rows)
+    finally:
+        cursor.close()
+    return row_count
+
+def write_audits(writer, engine, window, connection, form_ids=None, pool=None, workers=1, partial=False):
+    """Run the audit query with the chosen engine and return the number of rows written."""
+    if engine == 'set':
+        return write_audits_set(writer, connection, window,
+                                SET_AUDIT_PARTIAL_QUERY if partial else SET_AUDIT_QUERY)
+
+    query = AUDIT_PARTIAL_QUERY if partial else AUDIT_QUERY
+    if pool is not None and len(form_ids) > 1:
+        return write_audits_parallel(writer, form_ids, pool, window, workers, query)
+    return write_audits_serial(writer, form_ids, connection, window, query)
+
+def fetch_form_audits(first_day, last_day, form_ids, connection, engine='per_form', pool=None, workers=1):
+    start_date_str, end_date_str = audit_window(first_day, last_day)
+    filename, _ = report_period(first_day, last_day)
+
+    logging.info(f"Fetching audit logs from {start_date_str} to {end_date_str}")
+    logging.info(f"Writing results to {filename}")
+
+    try:
+        with open(filename, mode='w', newline='') as file:
+            writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+            if engine == 'set':
+                logging.info("Querying all forms with a single set-based query")
+            elif pool is not None:
+                logging.info(f"Querying {len(form_ids)} forms on {workers} connections")
+            row_count = write_audits(writer, engine, (start_date_str, end_date_str), connection,
+                                     form_ids, pool, workers)
 
             logging.info(f"Wrote {row_count} rows to {filename}")
             logging.info(f"Returning filename: {filename}")
     except Exception as e:
         logging.error(f"Error while fetching audit records: {e}")
         return None
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
 
     return filename
 
-def send_email_with_attachment(config, file_path):
+# ── Cached monthly partials ───────────────────────────────────────────────────
+#
+# Each finished calendar month is queried once and its per-record aggregates
+# are kept in a local SQLite file keyed by month and form id. A longer report
+# re-aggregates the cached months with the same MIN/MAX functions as the audit
+# query, so only the open month (and partial months at the edges of a --from/
+# --to range) go to the database. Cached months keep the record state they
+# were cached with; delete the month from cached_months to refresh it.
+
+CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS audit_partials (
+        month TEXT NOT NULL,
+        form_id INTEGER NOT NULL,
+        record_id INTEGER NOT NULL,
+        form_name TEXT,
+        created_on TEXT,
+        created_by TEXT,
+        updated_on TEXT,
+        updated_by TEXT
+    );
+    CREATE INDEX IF NOT EXISTS audit_partials_month ON audit_partials (month, form_id);
+    CREATE TABLE IF NOT EXISTS cached_months (
+        month TEXT PRIMARY KEY,
+        row_count INTEGER NOT NULL,
+        cached_on TEXT NOT NULL
+    );
+    CREATE TEMP TABLE open_partials AS SELECT * FROM audit_partials WHERE 0;
+"""
+
+ASSEMBLE_QUERY = """
+    SELECT record_id, form_name, MIN(created_on), MIN(created_by), MAX(updated_on), MAX(updated_by)
+    FROM (
+        SELECT * FROM audit_partials WHERE month IN ({months})
+        UNION ALL
+        SELECT * FROM open_partials WHERE month IN ({months})
+    )
+    GROUP BY form_id, record_id, form_name
+    ORDER BY form_id, record_id
+"""
+
+REPORT_COLUMNS = ["Record Id", "Form Name", "Created On", "Created By", "Last Updated On", "Last Updated By"]
+
+class PartialWriter:
+    """
+    Stand-in for csv.writer that stores form id tagged audit rows of one month
+    in the cache. writerow is only used by the engines for the header.
+    """
+
+    def __init__(self, cache, table, month):
+        self.cache = cache
+        self.table = table
+        self.month = month
+
+    def writerow(self, row):
+        pass
+
+    def writerows(self, rows):
+        # Store values as the CSV would print them so MIN/MAX order them the same way
+        self.cache.executemany(
+            f"INSERT INTO {self.table} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(self.month, *(v if v is None or isinstance(v, int) else str(v) for v in row)) for row in rows]
+        )
+
+def open_cache(path):
+    cache = sqlite3.connect(path)
+    cache.executescript(CACHE_SCHEMA)
+    return cache
+
+def month_windows(first_day, last_day):
+    """Split first_day..last_day into (month, first, last, whole month) pieces."""
+    windows = []
+    month_start = date(first_day.year, first_day.month, 1)
+    while month_start <= last_day:
+        month_end = month_start.replace(day=calendar.monthrange(month_start.year, month_start.month)[1])
+        start = max(month_start, first_day)
+        end = min(month_end, last_day)
+        windows.append((month_start.strftime("%Y-%m"), start, end, start == month_start and end == month_end))
+        month_start = month_end + timedelta(days=1)
+    return windows
+
+def is_cached(cache, month):
+    return cache.execute("SELECT 1 FROM cached_months WHERE month = ?", (month,)).fetchone() is not None
+
+def load_months(cache, windows, connection, engine, form_ids, pool, workers):
+    """Make sure every month in windows is in the cache, querying only what is missing."""
+    first_open_day = date.today().replace(day=1)
+    for month, start, end, whole in windows:
+        closed = whole and end < first_open_day
+        if closed and is_cached(cache, month):
+            logging.info(f"Using cached audit partials for {month}")
+            continue
+
+        table = 'audit_partials' if closed else 'open_partials'
+        window = audit_window(start, end)
+        logging.info(f"Fetching audit logs from {window[0]} to {window[1]}")
+        cache.execute(f"DELETE FROM {table} WHERE month = ?", (month,))
+        row_count = write_audits(PartialWriter(cache, table, month), engine, window, connection,
+                                 form_ids, pool, workers, partial=True)
+        if closed:
+            cache.execute("INSERT INTO cached_months VALUES (?, ?, ?)",
+                          (month, row_count, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            logging.info(f"Cached {row_count} audit partials for {month}")
+        cache.commit()
+
+def assemble_report(cache, months, filename):
+    placeholders = ", ".join("?" * len(months))
+    cursor = cache.execute(ASSEMBLE_QUERY.format(months=placeholders), (*months, *months))
+    row_count = 0
+    with open(filename, mode='w', newline='') as file:
+        writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+        writer.writerow(REPORT_COLUMNS)
+        for row in cursor:
+            writer.writerow(row)
+            row_count += 1
+    logging.info(f"Wrote {row_count} rows to {filename}")
+
+def fetch_period_audits(first_day, last_day, connection, cache, engine='per_form', form_ids=None,
+                        pool=None, workers=1, per_month=False):
+    """
+    Build the report for first_day..last_day from cached monthly partials, or
+    one report per month with per_month. Returns a list of (file name, label).
+    """
+    windows = month_windows(first_day, last_day)
+    try:
+        load_months(cache, windows, connection, engine, form_ids, pool, workers)
+
+        if per_month:
+            periods = [([month], report_period(start, end)) for month, start, end, _ in windows]
+        else:
+            periods = [([month for month, *_ in windows], report_period(first_day, last_day))]
+
+        reports = []
+        for months, (filename, label) in periods:
+            logging.info(f"Writing results to {filename}")
+            assemble_report(cache, months, filename)
+            reports.append((filename, label))
+        return reports
+    except Exception as e:
+        cache.rollback()
+        logging.error(f"Error while fetching audit records: {e}")
+        return []
+
+# ── Report attachments ────────────────────────────────────────────────────────
+
+def send_email_with_attachment(config, file_path, period):
     try:
-        msg = EmailMessage()
-        msg['From'] = config.get('from_email_address')
-        msg['To'] = config.get('to_email_address')
-        msg['Date'] = formatdate(localtime=True)
-        msg['Subject'] = '[PROD]:OpenSpecimen/BC2: Form Audit Report - April 2025'
-        msg.set_content('Hi,\n\nPlease find attached the form audit report for April 2025.\n\nRegards,\nOpenSpecimen Administrator')
-
-        # Attach file
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
-            file_name = os.path.basename(file_path)
-            msg.add_attachment(file_data, maintype='application', subtype='octet-stream', filename=file_name)
+        compression = config.get('attachment_compression', 'gzip').lower()
+        if compression not in ATTACHMENT_TYPES:
+            raise ValueError(f"unknown attachment_compression '{compression}'")
+        max_mb = float(config.get('attachment_max_mb', 0) or 0)
+        _, maintype, subtype = ATTACHMENT_TYPES[compression]
+
+        parts = package_report(file_path, compression, int(max_mb * 1024 * 1024) or None, quoting=csv.QUOTE_ALL)
+        total_rows = sum(rows for _, rows in parts)
+        logging.info(f"Packaged {total_rows} rows into {len(parts)} attachment(s)")
 
         smtp_server = config.get('smtp_server_hostname')
         smtp_port = int(config.get('smtp_port'))
@@ -178,41 +503,107 @@ def send_email_with_attachment(config, file_path):
         if config.get('start_tls', 'disabled').lower() == 'enabled':
             server.starttls()
         server.login(smtp_username, smtp_password)
-        server.send_message(msg)
+
+        for number, (part_path, rows) in enumerate(parts, start=1):
+            subject = f'[PROD]:OpenSpecimen/BC2: Form Audit Report - {period}'
+            content = f'Hi,\n\nPlease find attached the form audit report for {period}. It contains {total_rows} records.'
+            if len(parts) > 1:
+                subject += f' (part {number} of {len(parts)})'
+                content += f'\nThe report is split into {len(parts)} emails; this part has {rows} records.'
+
+            msg = EmailMessage()
+            msg['From'] = config.get('from_email_address')
+            msg['To'] = config.get('to_email_address')
+            msg['Date'] = formatdate(localtime=True)
+            msg['Subject'] = subject
+            msg.set_content(content + '\n\nRegards,\nOpenSpecimen Administrator')
+
+            # Attach file
+            with open(part_path, 'rb') as f:
+                msg.add_attachment(f.read(), maintype=maintype, subtype=subtype,
+                                   filename=os.path.basename(part_path))
+            server.send_message(msg)
+
         server.quit()
 
         logging.info("Email with report successfully sent.")
     except Exception as e:
         logging.error(f"Error sending email: {e}")
 
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', expected YYYY-MM-DD")
+
 def main():
-    if len(sys.argv) != 2:
-        logging.error("Usage: python script.py <config.properties>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Email the BC2 form audit report (last month by default).")
+    parser.add_argument("config", help="config.properties file")
+    parser.add_argument("--from", dest="from_date", type=parse_date, help="First day of the report (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="to_date", type=parse_date,
+                        help="Last day of the report, inclusive (YYYY-MM-DD, default today)")
+    parser.add_argument("--per-month", action="store_true", help="Write and email one report per calendar month")
+    args = parser.parse_args()
 
-    config_file = sys.argv[1]
+    config_file = args.config
     if not os.path.isfile(config_file):
         logging.error(f"File '{config_file}' does not exist.")
         sys.exit(1)
 
+    if args.to_date and not args.from_date:
+        parser.error("--to requires --from")
+    if args.from_date:
+        first_day, last_day = args.from_date, args.to_date or date.today()
+        if first_day > last_day:
+            parser.error("--from is after --to")
+    else:
+        first_day, last_day = last_month_range()
+
     logging.info(f"Loading config from {config_file}")
     config = load_config(config_file)
 
+    engine = config.get('audit_engine', 'per_form')
+    if engine not in AUDIT_ENGINES:
+        logging.error(f"Unknown audit_engine '{engine}', expected one of {', '.join(AUDIT_ENGINES)}")
+        sys.exit(1)
+
+    # Ranges and per-month reports always go through the partials; without a
+    # configured cache file they are only kept for this run.
+    cache_file = config.get('audit_cache_file')
+    use_cache = bool(cache_file) or args.from_date is not None or args.per_month
+
     db_conn = connect_db(config)
 
-    form_ids = get_form_ids(db_conn)
-    if form_ids:
-      csv_file_path = fetch_form_audits(form_ids, db_conn)
+    form_ids = None
+    pool = None
+    workers = int(config.get('audit_workers', 1))
+    if engine != 'set':
+        form_ids = get_form_ids(db_conn)
+        if workers > 1 and len(form_ids) > 1:
+            pool = create_pool(config, workers)
+
+    reports = []
+    if engine == 'set' or form_ids:
+        if use_cache:
+            cache = open_cache(cache_file or ":memory:")
+            reports = fetch_period_audits(first_day, last_day, db_conn, cache, engine, form_ids,
+                                          pool, workers, args.per_month)
+            cache.close()
+        else:
+            csv_file_path = fetch_form_audits(first_day, last_day, form_ids, db_conn, engine, pool, workers)
+            if csv_file_path:
+                reports = [(csv_file_path, report_period(first_day, last_day)[1])]
     else:
         logging.warning("No form IDs found.")
 
     db_conn.close()
     logging.info("Database connection closed.")
-    
-    if csv_file_path:
-        send_email_with_attachment(config, csv_file_path)
+
+    if reports:
+        for csv_file_path, period in reports:
+            send_email_with_attachment(config, csv_file_path, period)
     else:
-        logging.warning("No form records found for this month.")
+        logging.warning("No form records found for this period.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,112 @@
+import csv
+import email
+import gzip
+import io
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+# The script opens logs/script_<date>.log in the working directory when it is imported
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    import forms_audit_report as audit
+finally:
+    os.chdir(_cwd)
+
+HEADER = ["Form Name", "Record ID", "Changed By", "Changed On", "Operation"]
+
+class Inbox:
+    """aiosmtpd handler keeping every message it receives."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return "250 OK"
+
+def authenticate(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=auth_data.login == b"reports" and auth_data.password == b"secret")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class SendEmailWithAttachmentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.inbox = Inbox()
+        self.smtpd = Controller(self.inbox, hostname="127.0.0.1", port=free_port(),
+                                authenticator=authenticate, auth_require_tls=False)
+        self.smtpd.start()
+        self.tmp = tempfile.mkdtemp()
+        self.report_file = os.path.join(self.tmp, "forms_audit_report.csv")
+        self.rows = [[f"Form {os.urandom(3).hex()}", str(i), f"user{os.urandom(3).hex()}@example.org",
+                      f"2024-01-{i % 28 + 1:02d} 10:00:00", "UPDATE" if i % 3 else "INSERT, then \"UPDATE\""]
+                     for i in range(60000)]
+        with open(self.report_file, "w", newline="") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(HEADER)
+            writer.writerows(self.rows)
+
+    def tearDown(self):
+        self.smtpd.stop()
+        shutil.rmtree(self.tmp)
+
+    def send(self, **settings):
+        config = {
+            'smtp_server_hostname': self.smtpd.hostname,
+            'smtp_port': str(self.smtpd.port),
+            'smtp_username': 'reports',
+            'smtp_password': 'secret',
+            'start_tls': 'disabled',
+            'from_email_address': 'audit@example.org',
+            'to_email_address': 'admin@example.org',
+            'attachment_compression': 'gzip',
+        }
+        config.update(settings)
+        audit.send_email_with_attachment(config, self.report_file, "2024-01")
+        return self.inbox.messages
+
+    def attachment(self, message):
+        return [part for part in message.walk() if part.get_filename()][0]
+
+    def attached_rows(self, message):
+        text = gzip.decompress(self.attachment(message).get_payload(decode=True)).decode("utf-8")
+        self.assertTrue(text.startswith('"Form Name","Record ID"'))
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], HEADER)
+        return rows[1:]
+
+    def test_report_split_into_gzip_parts(self):
+        max_bytes = 512 * 1024
+        messages = self.send(attachment_max_mb=str(max_bytes / (1024 * 1024)))
+        self.assertGreater(len(messages), 1)
+
+        rows = []
+        for number, message in enumerate(messages, start=1):
+            self.assertEqual(message["Subject"],
+                             f"[PROD]:OpenSpecimen/BC2: Form Audit Report - 2024-01 (part {number} of {len(messages)})")
+            attachment = self.attachment(message)
+            self.assertEqual(attachment.get_content_type(), "application/gzip")
+            self.assertEqual(attachment.get_filename(), f"forms_audit_report_part{number}.csv.gz")
+            self.assertLessEqual(len(attachment.get_payload(decode=True)), max_bytes)
+            rows.extend(self.attached_rows(message))
+        self.assertEqual(rows, self.rows)
+
+    def test_unsplit_report_keeps_its_name(self):
+        messages = self.send()
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]["Subject"], "[PROD]:OpenSpecimen/BC2: Form Audit Report - 2024-01")
+        self.assertEqual(self.attachment(messages[0]).get_filename(), "forms_audit_report.csv.gz")
+        self.assertEqual(self.attached_rows(messages[0]), self.rows)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,30 @@
+import io
+import csv
+import os
+import re
 import sys
+import json
+import time
+import argparse
+import tempfile
 import configparser
 import mysql.connector
 from mysql.connector import Error
 import pandas as pd
 import logging
+import queue
+import threading
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+from formLookups import build_reverse_index, map_series
+from recordIdAllocator import RecordIdAllocator, DEFAULT_BLOCK_SIZE
+
 # Set up logging
 logging.basicConfig(
     filename='/home/krishagni/Desktop/indiana/collection-container/script.log',  # Log file path
@@ -13,159 +32,580 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def escape_single_quote(input_string):
-    #Escape single quotes for SQL by replacing them with \\'
-    return input_string.replace("'", "\\'")
+REQUIRED_COLUMNS = ["CP Short Title", "Specimen Label", "IUGB Specimen Custom Fields#OnCore Collection Container"]
+CONTAINER_COLUMN = "IUGB Specimen Custom Fields#OnCore Collection Container"
+
+# Backslash escapes (escapechar='\\') never open or close a quoted field
+ESCAPED_CHAR_RE = re.compile(rb'\\.')
+
+REASON_MISSING_LABEL = "Specimen label missing in OpenSpecimen"
+REASON_UNMAPPED_CP = "CP short title has no form context"
+REASON_UNMAPPED_PV = "Collection container is not a permissible value"
+REASON_DB_ERROR = "Database error"
+
+# Resolved column -> reason recorded when a row cannot be resolved
+UNRESOLVED_REASONS = {
+    'OBJECT_ID': REASON_MISSING_LABEL,
+    'FORM_CTXT_ID': REASON_UNMAPPED_CP,
+    'DE_A_15': REASON_UNMAPPED_PV
+}
+
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_WRITER_THREADS = 1
+DEFAULT_LABEL_BATCH_SIZE = 10000
+DEFAULT_INSERT_ENGINE = 'insert'
+CSV_ENGINES = ('pandas', 'pyarrow')
+DEFAULT_CSV_ENGINE = 'pandas'
+DEFAULT_ARROW_BLOCK_SIZE = 16 * 1024 * 1024
+
+def put_or_stop(target_queue, item, stop_event):
+    """Put an item on a bounded queue, giving up if the pipeline is being torn down."""
+    while not stop_event.is_set():
+        try:
+            target_queue.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def get_or_stop(source_queue, stop_event):
+    """Take the next item from a queue, returning None if the pipeline is being torn down."""
+    while not stop_event.is_set():
+        try:
+            return source_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+    return None
 
-def insert_records(cursor, conn, input_file, de_table_name, pv_map, form_context_map, failed_report_csv_path):
-    retrive_max_record_id = f"SELECT max(record_id) FROM catissue_form_record_entry;"
-    retrive_spmn_ids_and_label = "SELECT identifier, label FROM catissue_specimen WHERE label IN"
+class LoadCheckpoint:
+    """
+    Track which chunks have been committed and persist the resume point.
+
+    Writers commit chunks out of order, so the resume point (chunk_id, offset) only
+    advances over the contiguous run of finished chunks. Chunks finished past it are
+    saved as well and skipped on resume, since loading them again would insert them
+    twice with new record ids. Chunks cut from the middle of a parsed block have no
+    byte offset to restart from (end_offset None), so the resume point only moves to
+    the end of a whole block. Chunk ids depend on how the file is cut into chunks,
+    so a checkpoint holding such chunks is only resumed with the same layout. The
+    file is rewritten atomically (temp file + rename) whenever a chunk finishes.
+    """
 
-    chunksize = 100
-    chunk_id = 100
+    def __init__(self, path, input_file, chunk_id=0, offset=0, done=(), layout=None):
+        self.path = path
+        self.input_file = os.path.abspath(input_file)
+        self.chunk_id = chunk_id
+        self.offset = offset
+        self.finished = {}
+        self.done = set(done)
+        self.layout = layout
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, input_file, layout=None):
+        """Read an existing checkpoint for input_file, or return None if there is none to resume from."""
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r') as f:
+            saved = json.load(f)
+        if saved['input_file'] != os.path.abspath(input_file):
+            raise ValueError(f"Checkpoint {path} belongs to {saved['input_file']}, not {input_file}")
+        if saved['offset'] > os.path.getsize(input_file):
+            raise ValueError(f"Checkpoint {path} points past the end of {input_file}")
+        done = saved.get('done', [])
+        if done and saved.get('layout') != layout:
+            raise ValueError(f"Checkpoint {path} was written with chunk layout {saved.get('layout')}; "
+                             f"resume with the same settings, not {layout}")
+        return cls(path, input_file, saved['chunk_id'], saved['offset'], done, layout)
+
+    def is_done(self, chunk_id):
+        """True if an earlier run already finished this chunk."""
+        return chunk_id in self.done
+
+    def chunk_done(self, chunk_id, end_offset):
+        """Mark a chunk as finished (committed, failed or empty), advance the resume point if possible and save."""
+        with self.lock:
+            self.finished[chunk_id] = end_offset
+            self.done.discard(chunk_id)
+            next_id = self.chunk_id + 1
+            while next_id in self.finished:
+                end_offset = self.finished[next_id]
+                if end_offset is not None:
+                    for finished_id in range(self.chunk_id + 1, next_id + 1):
+                        del self.finished[finished_id]
+                    self.chunk_id, self.offset = next_id, end_offset
+                next_id += 1
+            self.save()
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'input_file': self.input_file,
+                'chunk_id': self.chunk_id,
+                'offset': self.offset,
+                'done': sorted(set(self.finished) | self.done),
+                'layout': self.layout,
+                'updated_on': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+class FailureReport:
+    """
+    Append failed rows to the failed report CSV as they happen, with the reason
+    they failed, and keep a count per reason for the summary at the end.
+    """
 
-    required_columns = ["CP Short Title", "Specimen Label", "IUGB Specimen Custom Fields#OnCore Collection Container"]
+    def __init__(self, path, append=False):
+        append = append and os.path.isfile(path)
+        self.file = open(path, 'a' if append else 'w', newline='')
+        self.writer = csv.writer(self.file)
+        if not append:
+            self.writer.writerow(['Specimen Label', 'Reason'])
+            self.file.flush()
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def add(self, labels, reason):
+        with self.lock:
+            self.writer.writerows([label, reason] for label in labels)
+            self.file.flush()
+            self.counts[reason] = self.counts.get(reason, 0) + len(labels)
+
+    def close(self):
+        self.file.close()
+        total = sum(self.counts.values())
+        summary = f"{total} rows failed" + "".join(f"\n    {reason}: {count}" for reason, count in sorted(self.counts.items()))
+        logging.info(summary)
+        print(summary)
+
+def read_record(f):
+    """Read one CSV record, following quoted fields that span several lines."""
+    record = f.readline()
+    while record and unescaped_quote_count(record) % 2 == 1:
+        line = f.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+def unescaped_quote_count(line):
+    return ESCAPED_CHAR_RE.sub(b'', line).count(b'"')
+
+def record_boundary(data):
+    """Return the position just after the last complete record in data, or 0 if there is none."""
+    pos = data.rfind(b'\n')
+    while pos != -1:
+        if unescaped_quote_count(data[:pos + 1]) % 2 == 0:
+            return pos + 1
+        pos = data.rfind(b'\n', 0, pos)
+    return 0
+
+def read_record_blocks(f, chunk_size):
+    """Yield (end_offset, raw bytes) for every chunk_size records."""
+    while True:
+        records = []
+        for _ in range(chunk_size):
+            record = read_record(f)
+            if not record:
+                break
+            records.append(record)
+        if not records:
+            return
+        yield f.tell(), b''.join(records)
+
+def read_byte_blocks(f, block_size):
+    """
+    Yield (end_offset, raw bytes) for blocks of about block_size bytes that end on a record boundary.
+    Every block is read from the end of the previous one, so a run resumed at a block's end offset
+    cuts the rest of the file into the same blocks (and chunk ids) as the run that saved it.
+    """
+    while True:
+        start = f.tell()
+        data = f.read(block_size)
+        if not data:
+            return
+
+        cut = record_boundary(data)
+        while not cut:
+            # A single record longer than the block; keep reading until it ends
+            more = f.read(block_size)
+            if not more:
+                cut = len(data)
+                break
+            data += more
+            cut = record_boundary(data)
+
+        f.seek(start + cut)
+        yield start + cut, data[:cut]
+
+def parse_frame(data, usecols, csv_engine):
+    """Parse raw CSV bytes (header included) into a DataFrame of string columns."""
+    if csv_engine == 'pyarrow':
+        table = pa_csv.read_csv(
+            io.BytesIO(data),
+            parse_options=pa_csv.ParseOptions(quote_char='"', escape_char='\\', newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(include_columns=usecols,  # Read only required columns
+                                                  column_types={column: pa.string() for column in usecols},
+                                                  strings_can_be_null=True))
+        return table.to_pandas()
+
+    return pd.read_csv(io.BytesIO(data),
+                       dtype=str,
+                       usecols=usecols,  # Read only required columns
+                       quotechar='"',
+                       escapechar='\\')
+
+def read_frames(input_file, chunk_size, usecols, start_offset=0, csv_engine=DEFAULT_CSV_ENGINE,
+                block_size=DEFAULT_ARROW_BLOCK_SIZE):
+    """
+    Yield (end_offset, DataFrame) for the CSV, starting at start_offset. Records are
+    split on raw bytes so that the byte offset after each chunk is exact and a later
+    run can seek straight to it.
 
-    for chunk in pd.read_csv(input_file, 
-                         chunksize=chunksize, 
-                         dtype=str, 
-                         usecols=required_columns,  # Read only required columns
-                         low_memory=True, 
-                         quotechar='"', 
-                         escapechar='\\'):
-        # Filter out rows where "IUGB Specimen Custom Fields#OnCore Collection Container" is null
-        chunk = chunk.dropna(subset=["IUGB Specimen Custom Fields#OnCore Collection Container"])
-    
-        logging.info(f'Processing chunk {chunk_id}, remaining records: {len(chunk)}')
+    The pandas engine parses chunk_size records at a time; the pyarrow engine parses
+    blocks of about block_size bytes, which is much cheaper per row. read_chunks cuts
+    those blocks back into chunk_size chunks for the database.
+    """
+    with open(input_file, 'rb') as f:
+        header = read_record(f)
+        if start_offset:
+            f.seek(start_offset)
+
+        if csv_engine == 'pyarrow':
+            blocks = read_byte_blocks(f, block_size)
+        else:
+            blocks = read_record_blocks(f, chunk_size)
+
+        for end_offset, data in blocks:
+            yield end_offset, parse_frame(header + data, usecols, csv_engine)
+
+def benchmark_csv_engines(rows, path=None):
+    """Generate a synthetic export with the given number of rows and compare parse throughput of the CSV engines."""
+    path = path or os.path.join(tempfile.gettempdir(), f"os_csv_benchmark_{rows}.csv")
+    if not os.path.isfile(path):
+        print(f"Generating {rows} rows in {path}...")
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(["Identifier", "CP Short Title", "Specimen Label", "Specimen Type",
+                             "Comments", CONTAINER_COLUMN])
+            for i in range(rows):
+                writer.writerow([i, f"CP-{i % 50}", f"SPMN-{i:09d}", "Whole Blood",
+                                 "Received, checked\nand stored" if i % 1000 == 0 else "",
+                                 "" if i % 10 == 0 else f"Container {i % 20}"])
+
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    engines = ['pandas'] + (['pyarrow'] if pa is not None else [])
+    for csv_engine in engines:
+        start_time = time.perf_counter()
+        parsed = sum(len(frame) for _, frame in read_frames(path, DEFAULT_CHUNK_SIZE, REQUIRED_COLUMNS,
+                                                           csv_engine=csv_engine))
+        elapsed = time.perf_counter() - start_time
+        print(f"{csv_engine:>8}: {parsed} rows in {elapsed:.1f}s "
+              f"({parsed / elapsed:.0f} rows/s, {size_mb / elapsed:.1f} MB/s)")
+
+def read_chunks(input_file, chunk_size, csv_engine, csv_block_size, chunk_queue, checkpoint, stop_event):
+    """
+    Stage 1: parse the CSV and push normalized chunks of at most chunk_size rows to
+    the resolver, whichever engine parsed them. Only the last chunk of a parsed
+    block carries its end offset; the others have None.
+    """
+    chunk_id = checkpoint.chunk_id
+    for block_end_offset, frame in read_frames(input_file, chunk_size, REQUIRED_COLUMNS, checkpoint.offset,
+                                               csv_engine, csv_block_size):
+        for start in range(0, max(len(frame), 1), chunk_size):
+            chunk_id += 1
+            end_offset = block_end_offset if start + chunk_size >= len(frame) else None
+            if checkpoint.is_done(chunk_id):
+                # Committed by an earlier run after a chunk that was still in flight
+                checkpoint.chunk_done(chunk_id, end_offset)
+                continue
+
+            # Filter out rows where the collection container is null and replace NaN values with empty strings
+            chunk = frame.iloc[start:start + chunk_size].dropna(subset=[CONTAINER_COLUMN]).fillna('')
+            if chunk.empty:
+                checkpoint.chunk_done(chunk_id, end_offset)
+                continue
+
+            if not put_or_stop(chunk_queue, (chunk_id, end_offset, chunk), stop_event):
+                return
+
+def load_specimen_ids(conn, input_file, start_offset=0, csv_engine=DEFAULT_CSV_ENGINE,
+                      csv_block_size=DEFAULT_ARROW_BLOCK_SIZE, batch_size=DEFAULT_LABEL_BATCH_SIZE):
+    """
+    Resolve every specimen label in the input file (from start_offset on) up front. The labels are bulk
+    loaded into a session temporary table and resolved with a single indexed join,
+    returning a {label: specimen id} dictionary used by the resolver stage.
+    """
+    cursor = conn.cursor()
+    try:
+        # Copy the column definition of catissue_specimen.label so the join uses the same collation
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS os_load_spmn_labels")
+        cursor.execute("""
+            CREATE TEMPORARY TABLE os_load_spmn_labels (PRIMARY KEY (label))
+            SELECT label FROM catissue_specimen LIMIT 0
+        """)
+
+        label_count = 0
+        for _, chunk in read_frames(input_file, batch_size, ["Specimen Label", CONTAINER_COLUMN], start_offset,
+                                    csv_engine, csv_block_size):
+            labels = chunk.dropna(subset=[CONTAINER_COLUMN])["Specimen Label"].dropna().unique()
+            cursor.executemany("INSERT IGNORE INTO os_load_spmn_labels (label) VALUES (%s)", [(label,) for label in labels])
+            label_count += len(labels)
+        logging.info(f"Loaded {label_count} specimen labels into the lookup table.")
+
+        # Return the label as it appears in the input file, so the dictionary matches the CSV values
+        cursor.execute("""
+            SELECT tmp.label, spmn.identifier
+            FROM os_load_spmn_labels tmp
+            JOIN catissue_specimen spmn ON spmn.label = tmp.label
+        """)
+        specimen_ids = {}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            specimen_ids.update(rows)
+
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS os_load_spmn_labels")
+        conn.commit()
+    finally:
+        cursor.close()
 
-        # Remove unwanted columns and replace NaN values with empty strings
-        custom_form_data = chunk.fillna('')
+    logging.info(f"Resolved {len(specimen_ids)} specimen labels.")
+    return specimen_ids
 
-        # Extract the Specimen Label column from the custom_form_data table
-        spmn_labels = custom_form_data["Specimen Label"].to_list()
+def resolve_chunks(conn, chunk_queue, write_queue, specimen_ids, pv_index, form_context_index, failure_report, checkpoint,
+                   stop_event, record_id_block_size):
+    """Stage 2: resolve specimen labels, form contexts and PVs, and assign record ids."""
+    # Record ids are reserved in blocks from dyextn_id_seq, so parallel loaders never collide
+    record_ids = RecordIdAllocator(conn, block_size=record_id_block_size)
 
-        # Format spmn_labels for SQL query
-        formatted_spmn_labels = ", ".join(f"'{escape_single_quote(label)}'" for label in spmn_labels)
+    while True:
+        item = get_or_stop(chunk_queue, stop_event)
+        if item is None:
+            return
 
-        # Lookup and pull specimen ids based on specimen label from database
-        try:
-            cursor.execute(f"{retrive_spmn_ids_and_label} ({formatted_spmn_labels});")
-            specimen_ids_and_label = cursor.fetchall()
-            
-            logging.info(f"Retrieved specimen ids and labels for chunk {chunk_id}.")
-        except mysql.connector.Error as err:
-            logging.error(f"MySQL error while retrieving specimen ids and labels: {err}")
-            sys.exit(1)
-        
-        if len(specimen_ids_and_label) != 100:
-            missing_spmn_label = list(set(spmn_labels) - {spmn_info['label'] for spmn_info in specimen_ids_and_label})
-            failed_report = pd.DataFrame(columns=['Specimen Label'])
-            logging.error(f"Specimen labels {missing_spmn_label} are missing in OpenSpecimen.")
+        chunk_id, end_offset, custom_form_data = item
+        logging.info(f'Resolving chunk {chunk_id}, records: {len(custom_form_data)}')
 
-            # Filter rows from chunk that match missing specimen labels
-            missing_rows = pd.DataFrame(missing_spmn_label, columns=['Specimen Label'])
-            
-            # Append missing_rows data to failed_report DataFrame
-            failed_report = pd.concat([failed_report, missing_rows], ignore_index=True)
+        # Lookup specimen ids based on specimen label from the preloaded dictionary,
+        # and map CP short title to form_context_id and collection container to its PV id
+        custom_form_data['OBJECT_ID'] = custom_form_data["Specimen Label"].map(specimen_ids)
+        custom_form_data['FORM_CTXT_ID'] = map_series(custom_form_data['CP Short Title'], form_context_index)
+        custom_form_data['DE_A_15'] = map_series(custom_form_data[CONTAINER_COLUMN], pv_index)
 
-            # Save failed report to CSV
-            failed_report.to_csv(failed_report_csv_path, index=False)
+        for column, reason in UNRESOLVED_REASONS.items():
+            unresolved = custom_form_data[column].isna()
+            if unresolved.any():
+                failed_labels = custom_form_data.loc[unresolved, "Specimen Label"].to_list()
+                logging.error(f"{reason} for specimen labels {failed_labels}.")
+                failure_report.add(failed_labels, reason)
+                custom_form_data = custom_form_data[~unresolved]
 
-            # Removing missing specimen labels from input data.
-            custom_form_data = custom_form_data[~custom_form_data["Specimen Label"].isin(missing_spmn_label)]
+        if custom_form_data.empty:
+            checkpoint.chunk_done(chunk_id, end_offset)
+            continue
 
-        # Execute the query to retrieve max record id and save it in a variable
-        try:
-            cursor.execute(retrive_max_record_id)
-            max_record_id = cursor.fetchall()
-            max_record_id = max_record_id[0]['max(record_id)']
-            logging.info(f"Retrieved max record id: {max_record_id}.")
-        except mysql.connector.Error as err:
-            logging.error(f"MySQL error while retrieving max record id: {err}")
-            sys.exit(1)
+        custom_form_data = custom_form_data.astype({'OBJECT_ID': 'int64', 'FORM_CTXT_ID': 'int64', 'DE_A_15': 'int64'})
 
         # Generate new records ids
-        new_record_ids = [max_record_id + i for i in range(1,len(specimen_ids_and_label)+1)]
-
-        # Adding Identifier, Specimen label, and newly generated record id in a new dataframe. 
-        # This dataframe is later used to insert data to catissue_form_record_entry table
-        specimen_ids_and_label_record_id = pd.DataFrame(specimen_ids_and_label)
-        specimen_ids_and_label_record_id = specimen_ids_and_label_record_id.rename(columns={
-            'identifier': 'OBJECT_ID',
-            'label': 'Specimen Label'
-        })
-        
-        specimen_ids_and_label_record_id['RECORD_ID'] = new_record_ids
+        custom_form_data['RECORD_ID'] = record_ids.next_ids(len(custom_form_data))
 
-        #print(specimen_ids_and_label_record_id)
-        # Prepare dataframe to insert data to custom form table
-        custom_form_data = (custom_form_data
-                    .merge(specimen_ids_and_label_record_id[['Specimen Label', 'RECORD_ID']], how='inner', on='Specimen Label')
-                    .drop(columns=['Specimen Label'], errors='ignore')  # Drop Specimen Label safely
-                    .rename(columns={'RECORD_ID': 'Identifier'}) # Rename RECORD_ID to Identifier
-        )
+        if not put_or_stop(write_queue, (chunk_id, end_offset, custom_form_data), stop_event):
+            return
 
+def form_record_entries(custom_form_data):
+    """Prepare the catissue_form_record_entry rows for one resolved chunk."""
+    return pd.DataFrame(data={
+        "FORM_CTXT_ID": custom_form_data['FORM_CTXT_ID'],
+        "RECORD_ID": custom_form_data['RECORD_ID'],
+        "OBJECT_ID": custom_form_data['OBJECT_ID'],
+        "UPDATED_BY": 2,                                                        # Replace with form user_id
+        "UPDATE_TIME": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "ACTIVITY_STATUS": "ACTIVE",
+        "FORM_STATUS": "COMPLETE"
+    })
 
-        # Map CP short title in custom_form_data to form_context_id
-        custom_form_data['FORM_CTXT_ID'] = custom_form_data['CP Short Title'].map(
-            lambda cp: next((key for key, value in form_context_map.items() if value == cp), None)
-        )
-        custom_form_data['DE_A_15'] = custom_form_data['IUGB Specimen Custom Fields#OnCore Collection Container'].map(
-            lambda container: next((key for key, value in pv_map.items() if value == container), None)
-        )
+def insert_chunk(conn, cursor, de_table_name, chunk_id, custom_form_data):
+    """Insert one resolved chunk into catissue_form_record_entry and the DE table with multi-row INSERTs."""
+    catissue_form_record_entry = form_record_entries(custom_form_data)
 
-        # Prepare dataframe to insert data to catissue_form_record_entry
-        catissue_form_record_entry = pd.DataFrame(data = {                                            # Replace with form association id
-            "UPDATED_BY": [2] * len(specimen_ids_and_label_record_id),                                                # Replace with form user_id
-            "UPDATE_TIME": [datetime.now().strftime('%Y-%m-%d %H:%M:%S')] * len(specimen_ids_and_label_record_id),
-            "ACTIVITY_STATUS": ["ACTIVE"] * len(specimen_ids_and_label_record_id),
-            "FORM_STATUS": ["COMPLETE"] * len(specimen_ids_and_label_record_id)
-        })
+    column_for_form_record_entry = ", ".join(catissue_form_record_entry.columns)
+    values_for_form_record_entry = ",\n".join(
+        f"({', '.join(map(repr, row))})" for row in catissue_form_record_entry.itertuples(index=False, name=None)
+    )
 
-        catissue_form_record_entry['FORM_CTXT_ID'] = custom_form_data['FORM_CTXT_ID']
-        catissue_form_record_entry['RECORD_ID'] = specimen_ids_and_label_record_id['RECORD_ID']
-        catissue_form_record_entry['OBJECT_ID'] = specimen_ids_and_label_record_id['OBJECT_ID']
+    insert_data_to_form_record_entry = f"INSERT INTO catissue_form_record_entry ({column_for_form_record_entry}) VALUES\n{values_for_form_record_entry};"
 
-        column_for_form_record_entry = ", ".join(catissue_form_record_entry.columns)
-        values_for_form_record_entry = ",\n".join(
-            f"({', '.join(map(repr, row))})" for row in catissue_form_record_entry.itertuples(index=False, name=None)
-        )
+    columns_for_de = ", ".join(["IDENTIFIER", "DE_A_15"])
 
-        insert_data_to_form_record_entry = f"INSERT INTO catissue_form_record_entry ({column_for_form_record_entry}) VALUES\n{values_for_form_record_entry};"
+    column_for_de_data_entry = ",\n".join(
+        f"({row.RECORD_ID}, {row.DE_A_15})" for row in custom_form_data.itertuples(index=False)
+    )
 
-        columns_for_de = ", ".join(["IDENTIFIER", "DE_A_15"])
+    de_insert_query = f"INSERT INTO {de_table_name} ({columns_for_de}) VALUES\n{column_for_de_data_entry};"
 
-        column_for_de_data_entry = ",\n".join(
-            f"({row.Identifier}, {row.DE_A_15})" for row in custom_form_data.itertuples(index=False)
-        )
+    cursor.execute(insert_data_to_form_record_entry)
+    cursor.execute(de_insert_query)
+    conn.commit()
 
-        de_insert_query = f"INSERT INTO {de_table_name} ({columns_for_de}) VALUES\n{column_for_de_data_entry};"
+def load_data_into(cursor, table_name, frame):
+    """Write a frame to a temporary TSV file and LOAD DATA LOCAL INFILE it into a table."""
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', prefix='os_load_', delete=False) as tsv:
+        frame.to_csv(tsv, sep='\t', header=False, index=False, na_rep='\\N', lineterminator='\n')
+        tsv_path = tsv.name
 
-        reset_record_id_seq = f"UPDATE dyextn_id_seq SET LAST_ID = {max_record_id + len(specimen_ids_and_label_record_id)} WHERE TABLE_NAME = 'RECORD_ID_SEQ';"
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE '{tsv_path}' INTO TABLE {table_name}
+            FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'
+            ({", ".join(frame.columns)})
+        """)
+    finally:
+        os.remove(tsv_path)
+
+def load_chunk(conn, cursor, de_table_name, chunk_id, custom_form_data):
+    """Load one resolved chunk into catissue_form_record_entry and the DE table with LOAD DATA LOCAL INFILE."""
+    catissue_form_record_entry = form_record_entries(custom_form_data)
+    de_data_entry = pd.DataFrame(data={
+        "IDENTIFIER": custom_form_data['RECORD_ID'],
+        "DE_A_15": custom_form_data['DE_A_15']
+    })
+
+    # Both loads run in one transaction, so a chunk is either fully loaded or not at all
+    load_data_into(cursor, "catissue_form_record_entry", catissue_form_record_entry)
+    load_data_into(cursor, de_table_name, de_data_entry)
+    conn.commit()
+
+INSERT_ENGINES = {
+    'insert': insert_chunk,
+    'load_data': load_chunk
+}
+
+def write_chunks(db_config, de_table_name, insert_engine, write_queue, failure_report, write_stats, checkpoint, stop_event):
+    """Stage 3: commit resolved chunks on a dedicated connection."""
+    write_chunk = INSERT_ENGINES[insert_engine]
+    conn = mysql.connector.connect(**db_config, allow_local_infile=(insert_engine == 'load_data'))
+    cursor = conn.cursor(dictionary=True)
+    try:
+        while True:
+            item = get_or_stop(write_queue, stop_event)
+            if item is None:
+                return
+
+            chunk_id, end_offset, custom_form_data = item
+            try:
+                start_time = time.perf_counter()
+                write_chunk(conn, cursor, de_table_name, chunk_id, custom_form_data)
+                write_stats.append((len(custom_form_data), time.perf_counter() - start_time))
+                logging.info(f"Inserted chunk {chunk_id}, records: {len(custom_form_data)}")
+            except mysql.connector.Error as err:
+                spmn_labels = custom_form_data["Specimen Label"].to_list()
+                logging.error(f"Database error on chunk {chunk_id}: {err}\n for specimen labels {spmn_labels}")
+                conn.rollback()
+                failure_report.add(spmn_labels, f"{REASON_DB_ERROR}: {err.msg}")
+
+            checkpoint.chunk_done(chunk_id, end_offset)
+    finally:
+        cursor.close()
+        conn.close()
+
+def log_throughput(insert_engine, write_stats, elapsed):
+    """Log rows per second for the writers alone and for the whole load, to compare engines."""
+    rows = sum(count for count, _ in write_stats)
+    write_time = sum(seconds for _, seconds in write_stats)
+    write_rate = rows / write_time if write_time else 0
+    load_rate = rows / elapsed if elapsed else 0
+    message = (f"Engine {insert_engine}: wrote {rows} rows in {write_time:.1f}s of writer time ({write_rate:.0f} rows/s), "
+               f"{elapsed:.1f}s wall clock ({load_rate:.0f} rows/s).")
+    logging.info(message)
+    print(message)
+
+def run_stage(target, errors, stop_event, *args):
+    """Run a pipeline stage, stopping the whole pipeline if it fails."""
+    try:
+        target(*args)
+    except Exception as err:
+        logging.error(f"Pipeline stage {target.__name__} failed: {err}")
+        errors.append(err)
+        stop_event.set()
+
+def insert_records(conn, db_config, input_file, de_table_name, pv_index, form_context_index, failed_report_csv_path,
+                   chunk_size=DEFAULT_CHUNK_SIZE, writer_threads=DEFAULT_WRITER_THREADS,
+                   record_id_block_size=DEFAULT_BLOCK_SIZE, insert_engine=DEFAULT_INSERT_ENGINE,
+                   checkpoint_file=None, resume=False, csv_engine=DEFAULT_CSV_ENGINE,
+                   csv_block_size=DEFAULT_ARROW_BLOCK_SIZE):
+    """
+    Load the input CSV as a three stage pipeline connected by bounded queues:
+    a reader parsing chunks, a resolver mapping labels to the preloaded specimen ids,
+    and a pool of writers each committing inserts on its own connection.
 
-        # Insert data in tables
-        try:
-            cursor.execute(insert_data_to_form_record_entry)
-            cursor.execute(de_insert_query)
-            cursor.execute(reset_record_id_seq)
-            conn.commit()
-        except mysql.connector.Error as err:
-            logging.error(f"Database error on chunk {chunk_id}: {err}\n for specimen labels {spmn_labels}")
-            conn.rollback()
-
-        # Append error specimen labels to failed_report DataFrame
-        error_label = pd.DataFrame(spmn_labels, columns=['Specimen Label'])
-        failed_report = pd.concat([failed_report, error_label], ignore_index=True)
-            
-        # Save failed report to CSV
-        failed_report.to_csv(failed_report_csv_path, index=False)
-        
-        # Increment chunk ID for the next chunk
-        chunk_id += 100
-        continue #Skip to the next chunk
+    Progress is checkpointed after every commit; with resume=True the load seeks
+    straight past the chunks recorded in the checkpoint file and skips the ones
+    committed out of order beyond that point.
+    """
+    checkpoint_file = checkpoint_file or f"{input_file}.checkpoint"
+    layout = {'chunk_size': chunk_size, 'csv_engine': csv_engine, 'csv_block_size': csv_block_size}
+    checkpoint = LoadCheckpoint.load(checkpoint_file, input_file, layout) if resume else None
+    if checkpoint:
+        logging.info(f"Resuming after chunk {checkpoint.chunk_id} at byte offset {checkpoint.offset}, "
+                     f"skipping {len(checkpoint.done)} chunk(s) already committed past it.")
+    else:
+        if resume:
+            logging.warning(f"No checkpoint found at {checkpoint_file}, loading from the start.")
+        checkpoint = LoadCheckpoint(checkpoint_file, input_file, layout=layout)
+
+    specimen_ids = load_specimen_ids(conn, input_file, checkpoint.offset, csv_engine, csv_block_size)
+
+    chunk_queue = queue.Queue(maxsize=writer_threads * 2)
+    write_queue = queue.Queue(maxsize=writer_threads * 2)
+    stop_event = threading.Event()
+    failure_report = FailureReport(failed_report_csv_path, append=resume)
+    write_stats = []
+    errors = []
+
+    reader = threading.Thread(target=run_stage, name="reader",
+                              args=(read_chunks, errors, stop_event, input_file, chunk_size, csv_engine, csv_block_size,
+                                    chunk_queue, checkpoint, stop_event))
+    resolver = threading.Thread(target=run_stage, name="resolver",
+                                args=(resolve_chunks, errors, stop_event, conn, chunk_queue, write_queue, specimen_ids,
+                                      pv_index, form_context_index, failure_report, checkpoint, stop_event,
+                                      record_id_block_size))
+    writers = [
+        threading.Thread(target=run_stage, name=f"writer-{i}",
+                         args=(write_chunks, errors, stop_event, db_config, de_table_name, insert_engine, write_queue,
+                               failure_report, write_stats, checkpoint, stop_event))
+        for i in range(writer_threads)
+    ]
+
+    logging.info(f"Starting pipelined load: chunk size {chunk_size}, {writer_threads} writer(s), "
+                 f"{csv_engine} CSV engine, {insert_engine} insert engine.")
+    load_start = time.perf_counter()
+    for thread in [reader, resolver] + writers:
+        thread.start()
+
+    # Drain each stage in order, signalling end of input with one None per consumer
+    reader.join()
+    put_or_stop(chunk_queue, None, stop_event)
+    resolver.join()
+    for _ in writers:
+        put_or_stop(write_queue, None, stop_event)
+    for writer in writers:
+        writer.join()
+    log_throughput(insert_engine, write_stats, time.perf_counter() - load_start)
+
+    failure_report.close()
+    logging.info(f"Load finished. Checkpoint at chunk {checkpoint.chunk_id}, byte offset {checkpoint.offset}.")
+
+    if errors:
+        logging.error("Pipelined load aborted due to errors.")
+        sys.exit(1)
 
 def get_form_context(cursor, container_id, group_id):
-    """Fetch form context details and store them in a dictionary."""
+    """Fetch form contexts as a {normalized CP short title: form context id} index."""
     query = """
         SELECT 
             ctxt.identifier as 'form_context_id',
@@ -183,12 +623,12 @@ def get_form_context(cursor, container_id, group_id):
     """
     cursor.execute(query, (group_id, container_id))
     results = cursor.fetchall()
-    
-    form_context_map = {row['form_context_id']: row['cp_short_title'] for row in results}
-    return form_context_map
+
+    # Index by normalized CP short title, the value the input CSV carries
+    return build_reverse_index(results, 'form_context_id', 'cp_short_title')
 
 def get_pv_values(cursor, public_id):
-    """Fetch permissible values from the database and store them in a dictionary."""
+    """Fetch permissible values as a {normalized value: PV id} index."""
     query = """
         SELECT identifier, value
         FROM catissue_permissible_value
@@ -197,16 +637,26 @@ def get_pv_values(cursor, public_id):
     cursor.execute(query, (public_id,))
     results = cursor.fetchall()
 
-    pv_map = {row['identifier']: row['value'] for row in results}
-    return pv_map
+    # Index by normalized PV value, the value the input CSV carries
+    return build_reverse_index(results, 'identifier', 'value')
 
 def main():
     """Main function to perform the update in batches."""
-    if len(sys.argv) != 2:
-        print("Usage: python batch_update.py <config_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Bulk load custom field records from a CSV export.')
+    parser.add_argument('config_file', nargs='?', help='Path to the configuration file')
+    parser.add_argument('--resume', action='store_true', help='Resume from the checkpoint of an interrupted load')
+    parser.add_argument('--benchmark-csv', type=int, metavar='ROWS',
+                        help='Compare CSV engine parse throughput on a generated export of ROWS rows and exit')
+    args = parser.parse_args()
+
+    if args.benchmark_csv:
+        benchmark_csv_engines(args.benchmark_csv)
+        return
 
-    config_file = sys.argv[1]
+    if not args.config_file:
+        parser.error("config_file is required")
+
+    config_file = args.config_file
 
     # Read database configuration from config file
     config = configparser.ConfigParser()
@@ -226,26 +676,46 @@ def main():
     entity_type = config['mysql']['entity_type']
     de_table_name = config['mysql']['de_table_name']
     failed_report_csv_path = config['mysql']['failed_report_csv_path']
+    chunk_size = config['mysql'].getint('chunk_size', fallback=DEFAULT_CHUNK_SIZE)
+    writer_threads = config['mysql'].getint('writer_threads', fallback=DEFAULT_WRITER_THREADS)
+    record_id_block_size = config['mysql'].getint('record_id_block_size', fallback=DEFAULT_BLOCK_SIZE)
+    insert_engine = config['mysql'].get('insert_engine', fallback=DEFAULT_INSERT_ENGINE)
+    checkpoint_file = config['mysql'].get('checkpoint_file', fallback=None)
+    csv_engine = config['mysql'].get('csv_engine', fallback=DEFAULT_CSV_ENGINE)
+    if csv_engine not in CSV_ENGINES:
+        print(f"Unknown csv_engine '{csv_engine}', expected one of: {', '.join(CSV_ENGINES)}")
+        sys.exit(1)
+    if csv_engine == 'pyarrow' and pa is None:
+        print("csv_engine 'pyarrow' requires the pyarrow package")
+        sys.exit(1)
+    csv_block_size = config['mysql'].getint('csv_block_size', fallback=DEFAULT_ARROW_BLOCK_SIZE)
+    if insert_engine not in INSERT_ENGINES:
+        print(f"Unknown insert_engine '{insert_engine}', expected one of: {', '.join(INSERT_ENGINES)}")
+        sys.exit(1)
+
+    conn = None
     try:
         # Connect to the database
         conn = mysql.connector.connect(**db_config)
         cursor = conn.cursor(dictionary=True)
 
-        # Get PVs and store in a map
-        pv_map = get_pv_values(cursor, coll_cont_public_id)
-        #print("Permissible Values:", pv_map)
+        # Get PVs and store in a lookup index
+        pv_index = get_pv_values(cursor, coll_cont_public_id)
+        #print("Permissible Values:", pv_index)
         
-        # Get Form Context and store in a map
-        form_context_map = get_form_context(cursor, container_id, cpg_id)
-        #print("Form Context:", form_context_map)
+        # Get Form Context and store in a lookup index
+        form_context_index = get_form_context(cursor, container_id, cpg_id)
+        #print("Form Context:", form_context_index)
 
-        insert_records(cursor, conn, input_file, de_table_name, pv_map, form_context_map, failed_report_csv_path)
+        insert_records(conn, db_config, input_file, de_table_name, pv_index, form_context_index,
+                       failed_report_csv_path, chunk_size, writer_threads, record_id_block_size, insert_engine,
+                       checkpoint_file, args.resume, csv_engine, csv_block_size)
 
-    except Error as e:
+    except (Error, ValueError) as e:
         print(f"Error: {e}")
 
     finally:
-        if conn.is_connected():
+        if conn is not None and conn.is_connected():
             cursor.close()
             conn.close()
             print("MySQL connection closed.")
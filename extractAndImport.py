@@ -1,10 +1,23 @@
 import os
 import sys
+import gzip
+import json
+import time
+import zlib
+import hashlib
 import subprocess
 import datetime
 
+from importProfiles import IMPORT_PROFILES, import_init_command
+
 LOG_FILE = f"import_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
 
+DROP_TABLE_PREFIX = b"DROP TABLE IF EXISTS `"
+UNLOCK_TABLES = b"UNLOCK TABLES;"
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+CATALOG_NAME = ".backup_catalog.json"
+
 def log(level, message):
     timestamp = datetime.datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
     log_message = f"{timestamp} [{level}] {message}"
@@ -17,7 +30,29 @@ def start_reports_service():
     result = subprocess.run(["systemctl", "start", "reports"], capture_output=True)
     return result.returncode == 0
 
-def import_filtered_sql(sql_file, exclude_tables_file, db_user, db_password, db_host, db_name):
+def filter_dump(dump, out, exclude_tables):
+    """
+    Copy a mysqldump to out, leaving out the section (DROP TABLE to UNLOCK TABLES)
+    of every excluded table. The table name is looked up once per section; a
+    section also ends where the next table's DROP TABLE starts, so a table dumped
+    without data never swallows the following one. Returns the skipped tables.
+    """
+    skipped = []
+    skipping = False
+    for line in dump:
+        if line.startswith(DROP_TABLE_PREFIX):
+            table = line[len(DROP_TABLE_PREFIX):].split(b"`", 1)[0].decode("utf-8", errors="replace")
+            skipping = table in exclude_tables
+            if skipping:
+                skipped.append(table)
+                log("INFO", f"Skipping `{table}` as per exclude list.")
+        if not skipping:
+            out.write(line)
+        elif line.startswith(UNLOCK_TABLES):
+            skipping = False
+    return skipped
+
+def import_filtered_sql(sql_file, exclude_tables_file, db_user, db_password, db_host, db_name, profile="default"):
     if not os.path.isfile(exclude_tables_file):
         log("ERROR", f"Exclude tables file not found: {exclude_tables_file}")
         return False
@@ -26,41 +61,46 @@ def import_filtered_sql(sql_file, exclude_tables_file, db_user, db_password, db_
         log("ERROR", f"SQL file not found: {sql_file}")
         return False
 
-    log("INFO", f"Filtering SQL file: {sql_file} to exclude tables...")
+    log("INFO", f"Importing {sql_file} without the excluded tables...")
 
     # Read exclude tables (removing quotes)
     with open(exclude_tables_file, "r") as file:
-        exclude_tables = [line.strip().replace('"', '') for line in file.readlines()[1:] if line.strip()]  # Skip header
+        exclude_tables = {line.strip().replace('"', '') for line in file.readlines()[1:] if line.strip()}  # Skip header
 
     if not exclude_tables:
         log("ERROR", "No tables found in the exclude list.")
         return False
 
-    # Build the sed command dynamically
-    sed_command = ["sed"]
-    for table in exclude_tables:
-        # Remove table structure and data section (DROP TABLE to UNLOCK TABLES)
-        sed_command.extend(["-e", rf"/DROP TABLE IF EXISTS `{table}`/,/UNLOCK TABLES;/d"])
-
-    # Append the SQL file at the end
-    sed_command.append(sql_file)
-
     try:
         # Open a subprocess for the MySQL command
         mysql_command = ["mysql", "-u", db_user, f"-p{db_password}", "--host", db_host, db_name]
+        init_command, skipped_settings = import_init_command(profile, db_user, db_password, db_host)
+        for var in skipped_settings:
+            log("INFO", f"Import profile '{profile}': {var} cannot be set here, leaving it unchanged")
+        if init_command:
+            mysql_command.append(f"--init-command={init_command}")
+        log("INFO", f"Import profile '{profile}': {init_command or 'server defaults'}")
 
-        with subprocess.Popen(sed_command, stdout=subprocess.PIPE) as sed_proc, \
-             subprocess.Popen(mysql_command, stdin=sed_proc.stdout) as mysql_proc:
+        # The archive is read as it is decompressed and kept as it is
+        opener = gzip.open if sql_file.endswith(".gz") else open
+        start = time.time()
+        with opener(sql_file, "rb") as dump, \
+             subprocess.Popen(mysql_command, stdin=subprocess.PIPE, bufsize=WRITE_BUFFER_SIZE) as mysql_proc:
+            try:
+                skipped = filter_dump(dump, mysql_proc.stdin, exclude_tables)
+                mysql_proc.stdin.close()
+            except BrokenPipeError:
+                log("ERROR", "mysql exited before the whole dump was sent.")
+            mysql_proc.wait()
 
-            sed_proc.stdout.close()  # Allow sed to receive a SIGPIPE if MySQL exits
-            mysql_proc.communicate()  # Wait for MySQL to finish
+        if mysql_proc.returncode != 0:
+            log("ERROR", f"SQL import failed: mysql exited with code {mysql_proc.returncode}")
+            return False
 
-        log("INFO", "SQL import completed successfully, excluding specified tables.")
+        log("INFO", f"SQL import completed successfully, excluding {len(skipped)} tables, "
+                    f"in {time.time() - start:.0f}s with import profile '{profile}'.")
         return True
 
-    except subprocess.CalledProcessError as e:
-        log("ERROR", f"SQL import failed: {e}")
-        return False
     except Exception as e:
         log("ERROR", f"Unexpected error: {e}")
         return False
@@ -70,31 +110,132 @@ def stop_reports_service():
     result = subprocess.run(["systemctl", "stop", "reports"], capture_output=True)
     return result.returncode == 0
 
-def gunzip_latest_file(directory):
-    log("INFO", f"Looking for latest .gz file in directory: {directory}")
-    try:
-        gz_files = sorted(
-            [f for f in os.listdir(directory) if f.endswith(".gz")], 
-            key=lambda f: os.path.getmtime(os.path.join(directory, f)), 
-            reverse=True
-        )
-        if not gz_files:
-            raise FileNotFoundError("No .gz files found")
-        
-        latest_file = os.path.join(directory, gz_files[0])
-        log("INFO", f"Extracting: {latest_file}")
-        
-        result = subprocess.run(["gunzip", latest_file], check=True, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            log("ERROR", f"Extraction failed: {result.stderr}")
-            sys.exit(1)
-        
-        extracted_file = latest_file.replace(".gz", "")
-        return extracted_file
-    except Exception as e:
-        log("ERROR", f"Extraction failed: {str(e)}")
-        sys.exit(1)
+# ---------------------------------------------------------------------------
+# Backup catalog: what is in BACKUP_DIR, whether it is intact and whether it was
+# restored, so each archive is only read once, when it first shows up.
+# ---------------------------------------------------------------------------
+def load_catalog(path):
+    if not os.path.isfile(path):
+        return {"backups": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_catalog(path, catalog):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(catalog, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def table_names(text, end):
+    """Names from the DROP TABLE lines that start in text before end."""
+    names = []
+    pos = 0 if text.startswith(DROP_TABLE_PREFIX, 0, end) else text.find(b"\n" + DROP_TABLE_PREFIX, 0, end)
+    while pos != -1:
+        name_start = text.index(b"`", pos) + 1
+        name_end = text.find(b"`", name_start, end)
+        if name_end == -1:
+            break
+        names.append(text[name_start:name_end].decode("utf-8", errors="replace"))
+        pos = text.find(b"\n" + DROP_TABLE_PREFIX, name_end, end)
+    return names
+
+def inspect_backup(path):
+    """
+    Read an archive once: sha256 of the file, a full gzip decompression to prove it
+    is complete, and the tables it contains. Returns (sha256, tables); raises
+    ValueError or zlib.error for a damaged or truncated archive.
+    """
+    digest = hashlib.sha256()
+    inflater = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    tables = []
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            data = inflater.decompress(chunk)
+            while inflater.unused_data:  # concatenated gzip members
+                rest = inflater.unused_data
+                inflater = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                data += inflater.decompress(rest)
+
+            # DROP TABLE lines mark table sections. Only whole lines are scanned, so a line
+            # split across reads is seen once; the partial last line goes to the next chunk.
+            text = tail + data
+            end = text.rfind(b"\n") + 1
+            tables.extend(table_names(text, end))
+            tail = text[end:]
+            if len(tail) > len(DROP_TABLE_PREFIX) and not tail.startswith(DROP_TABLE_PREFIX):
+                tail = tail[:len(DROP_TABLE_PREFIX)]  # the start is enough to know it is not a DROP line
+    if not inflater.eof:
+        raise ValueError("archive is truncated")
+    tables.extend(table_names(tail, len(tail)))
+    return digest.hexdigest(), tables
+
+def refresh_catalog(directory, catalog):
+    """Add new or changed archives to the catalog (reading each once) and drop deleted ones."""
+    backups = catalog["backups"]
+    present = set()
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".gz") or not entry.is_file():
+            continue
+        present.add(entry.name)
+        stat = entry.stat()
+        known = backups.get(entry.name)
+        if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+            continue
+
+        log("INFO", f"Cataloging new backup: {entry.name}")
+        record = {"size": stat.st_size, "mtime": stat.st_mtime,
+                  "cataloged_at": datetime.datetime.now().isoformat(timespec="seconds")}
+        try:
+            record["sha256"], record["tables"] = inspect_backup(entry.path)
+            record["status"] = "valid"
+            log("INFO", f"{entry.name}: {len(record['tables'])} tables, sha256 {record['sha256']}")
+        except (ValueError, OSError, zlib.error) as e:
+            record["status"] = "invalid"
+            record["error"] = str(e)
+            log("ERROR", f"{entry.name} is not a usable backup: {e}")
+        backups[entry.name] = record
+
+    for name in set(backups) - present:
+        log("INFO", f"Removing deleted backup from the catalog: {name}")
+        del backups[name]
+
+def next_backup(catalog):
+    """
+    The newest intact backup, or None if it has already been restored: an older,
+    unrestored backup is never picked, as it would roll the reporting data back.
+    """
+    usable = [(record["mtime"], name) for name, record in catalog["backups"].items() if record["status"] != "invalid"]
+    if not usable:
+        return None
+    _, name = max(usable)
+    return None if catalog["backups"][name]["status"] == "restored" else name
+
+def record_import_time(catalog, name, profile, seconds):
+    """
+    Log this import's time and rate next to the last import with each profile, so
+    runs with and without an import profile can be compared, and keep it in the catalog.
+    """
+    size = catalog["backups"][name]["size"]
+    rate = size / 1048576 / seconds
+    log("INFO", f"Import of {name} took {seconds:.0f}s ({rate:.1f} MB/s) with import profile '{profile}'")
+    last_imports = catalog.setdefault("last_imports", {})
+    for other, entry in sorted(last_imports.items()):
+        other_rate = entry["size"] / 1048576 / entry["seconds"]
+        log("INFO", f"  last import with profile '{other}': {entry['backup']} took {entry['seconds']:.0f}s "
+                    f"({other_rate:.1f} MB/s); this one ran at {rate / other_rate:.0%} of that rate")
+    last_imports[profile] = {"backup": name, "size": size, "seconds": round(seconds, 1),
+                             "imported_at": datetime.datetime.now().isoformat(timespec="seconds")}
+
+def mark_backup(catalog, name, status):
+    catalog["backups"][name]["status"] = status
+    catalog["backups"][name][f"{status}_at"] = datetime.datetime.now().isoformat(timespec="seconds")
 
 def main(config_file):
     log("INFO", "Script execution started.")
@@ -118,9 +259,23 @@ def main(config_file):
     if not os.path.isdir(directory):
         log("ERROR", f"Directory does not exist: {directory}")
         sys.exit(1)
+
+    import_profile = config.get("IMPORT_PROFILE", "default")
+    if import_profile not in IMPORT_PROFILES:
+        log("ERROR", f"Unknown IMPORT_PROFILE '{import_profile}', expected one of: {', '.join(IMPORT_PROFILES)}")
+        sys.exit(1)
     
-    extracted_file = gunzip_latest_file(directory)
-    log("INFO", f"Extracted file: {extracted_file}")
+    catalog_path = config.get("CATALOG_FILE", os.path.join(directory, CATALOG_NAME))
+    catalog = load_catalog(catalog_path)
+    refresh_catalog(directory, catalog)
+    save_catalog(catalog_path, catalog)
+
+    backup_name = next_backup(catalog)
+    if not backup_name:
+        log("INFO", "The newest valid backup has already been restored; nothing to import.")
+        sys.exit(0)
+    backup_file = os.path.join(directory, backup_name)
+    log("INFO", f"Backup to import: {backup_file}")
     
     if stop_reports_service():
         log("INFO", "Reports service stopped successfully.")
@@ -128,9 +283,15 @@ def main(config_file):
         log("ERROR", "Stopping reports service failed. Exiting.")
         sys.exit(1)
     
-    if import_filtered_sql(extracted_file, config["EXCLUDE_TABLES"], config["DB_USER"], config["DB_PASSWORD"], config["DB_HOST"], config["DB_NAME"]):
+    import_start = time.time()
+    if import_filtered_sql(backup_file, config["EXCLUDE_TABLES"], config["DB_USER"], config["DB_PASSWORD"], config["DB_HOST"], config["DB_NAME"], import_profile):
+        record_import_time(catalog, backup_name, import_profile, max(time.time() - import_start, 1))
+        mark_backup(catalog, backup_name, "restored")
+        save_catalog(catalog_path, catalog)
         log("INFO", "Database import completed successfully.")
     else:
+        mark_backup(catalog, backup_name, "failed")
+        save_catalog(catalog_path, catalog)
         log("ERROR", "Database import failed. Exiting.")
         sys.exit(1)
     
@@ -0,0 +1,26 @@
+"""
+Reverse lookup indexes for form contexts and permissible values.
+
+The loaders receive human readable values (CP short titles, PV values, CP ids)
+and need the database identifiers behind them. Instead of scanning the
+identifier -> value maps for every row, the maps are inverted once into
+case-normalized dictionaries and applied to whole chunks at a time.
+"""
+
+def normalize_key(value):
+    """Normalize a lookup value so that case and surrounding spaces do not matter."""
+    if value is None:
+        return None
+    return str(value).strip().casefold()
+
+def build_reverse_index(rows, key_column, value_column):
+    """Build a {normalized value: key} index from database rows."""
+    return {normalize_key(row[value_column]): row[key_column] for row in rows}
+
+def lookup(index, value):
+    """Look up a single value in a reverse index."""
+    return index.get(normalize_key(value))
+
+def map_series(series, index):
+    """Vectorized lookup of a pandas Series of strings in a reverse index."""
+    return series.astype(str).str.strip().str.casefold().map(index)
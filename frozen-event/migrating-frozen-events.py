@@ -1,9 +1,15 @@
+import os
+import sys
 import pymysql
 import logging
 import json
 import time
 from datetime import datetime
 
+# The record id allocator is shared with the loaders at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recordIdAllocator import RecordIdAllocator
+
 # Logger setup
 logging.basicConfig(
     filename='migration.log',
@@ -19,19 +25,7 @@ with open('migrate.json') as f:
 BATCH_SIZE = 100
 FORM_CTXT_ID = 2
 UPDATED_BY = 564
-SEQUENCE_TABLE = 'RECORD_ID_SEQ'
-
-def get_max_record_id(cursor):
-    cursor.execute("SELECT IFNULL(MAX(record_id), 0) FROM catissue_form_record_entry")
-    return cursor.fetchone()[0]
-
-def update_record_id_seq(cursor, new_last_id):
-    update_query = """
-        UPDATE dyextn_id_seq
-        SET LAST_ID = %s
-        WHERE TABLE_NAME = %s
-    """
-    cursor.execute(update_query, (new_last_id, SEQUENCE_TABLE))
+RECORD_ID_BLOCK_SIZE = config.get('record_id_block_size', 1000)
 
 def migrate_data():
     connection = None
@@ -47,12 +41,14 @@ def migrate_data():
         )
 
         cursor = connection.cursor()
+        record_ids = RecordIdAllocator(connection, block_size=RECORD_ID_BLOCK_SIZE)
 
         offset = 0
         total_migrated = 0
+        total_failed = 0
         batch_num = 1
 
-                while True:
+        while True:
             start_time = time.time()
             logging.info(f"Fetching batch {batch_num} starting at offset {offset}")
             cursor.execute(
@@ -65,13 +61,12 @@ def migrate_data():
             if not rows:
                 break
 
-            max_record_id = get_max_record_id(cursor)
+            batch_record_ids = record_ids.next_ids(len(rows))
             entries = []
             events = []
 
-            for i, row in enumerate(rows):
+            for row, record_id in zip(rows, batch_record_ids):
                 specimen_id, _, frozen_on, frozen_media = row
-                record_id = max_record_id + i + 1
 
                 entries.append((
                     FORM_CTXT_ID,
@@ -86,14 +81,14 @@ def migrate_data():
 
                 # catissue_frozen_event_param (ensure frozen_on is used)
                 events.append((
-                    NULL,             # METHOD
+                    None,             # METHOD
                     frozen_on,        # EVENT_TIMESTAMP (from frozen_on)
                     specimen_id,
                     UPDATED_BY,
-                    NULL,             # COMMENTS
+                    None,             # COMMENTS
                     record_id,        # IDENTIFIER = record_id
                     b'\x00',          # INCREMENT_FREEZE_THAW
-                    NULL,             # METHOD_ID
+                    None,             # METHOD_ID
                     frozen_media      # DE_A_6 = frozen_media
                 ))
             try:
@@ -114,10 +109,6 @@ def migrate_data():
                     ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """, events)
 
-                # Update dyextn_id_seq
-                latest_record_id = max_record_id + len(rows)
-                update_record_id_seq(cursor, latest_record_id)
-
                 connection.commit()
 
                 batch_time = round(time.time() - start_time, 2)
@@ -128,16 +119,22 @@ def migrate_data():
                     f"time_to_insert={batch_time} sec"
                 )
                 logging.info(processed_msg)
-                logging.info(f"Updated dyextn_id_seq.RECORD_ID_SEQ to {latest_record_id}")
+                logging.info(f"Used record ids {batch_record_ids[0]} to {batch_record_ids[-1]}")
 
             except Exception as batch_error:
                 connection.rollback()
-                logging.error(f"Batch {batch_num} failed. Rolling back.", exc_info=True)
-                continue  # Optionally skip to the next batch or exit
+                total_failed += len(rows)
+                # Move on past the batch; retrying it would fail again and reserve another id block each time
+                logging.error(
+                    f"Batch {batch_num} failed. Rolling back and skipping specimens {rows[0][0]} to {rows[-1][0]} "
+                    f"(total_failed={total_failed}).", exc_info=True
+                )
 
             offset += BATCH_SIZE
             batch_num += 1
 
+        logging.info(f"Migration finished: migrated={total_migrated} failed={total_failed}")
+
     except Exception as e:
         if connection:
             connection.rollback()
@@ -0,0 +1,43 @@
+"""
+Session settings for bulk loading a dump with the mysql client, shared by the
+restore scripts.
+
+A profile is sent as the --init-command of every import connection. The
+settings only last for that session, so nothing needs restoring after the
+import.
+"""
+import subprocess
+
+IMPORT_PROFILES = {
+    "default": {},
+    "fast": {
+        "foreign_key_checks": 0,
+        "unique_checks": 0,
+        "bulk_insert_buffer_size": 256 * 1024 * 1024,
+        "sql_log_bin": 0,
+    },
+}
+
+# Settings that need a privilege RDS does not grant
+PRIVILEGED_SETTINGS = {"sql_log_bin"}
+
+def import_init_command(profile, user, password, host):
+    """
+    Return (init command, settings left out) for an import profile. Privileged
+    settings are tried on a throwaway connection first and left out if refused,
+    as a failing init command would make every import connection fail.
+    """
+    settings = {}
+    skipped = []
+    for var, value in IMPORT_PROFILES[profile].items():
+        if var in PRIVILEGED_SETTINGS:
+            probe = subprocess.run(["mysql", f"-u{user}", f"-p{password}", "-h", host,
+                                    "-e", f"SET SESSION {var} = {value}"], capture_output=True)
+            if probe.returncode != 0:
+                skipped.append(var)
+                continue
+        settings[var] = value
+
+    if not settings:
+        return "", skipped
+    return "SET " + ", ".join(f"SESSION {var} = {value}" for var, value in settings.items()), skipped
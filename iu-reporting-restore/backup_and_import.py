@@ -8,16 +8,40 @@ import datetime
 import time
 import re
 import gzip
+import queue
+import hashlib
 import shutil
 import logging
+import tempfile
+import threading
+
+# The import profiles are shared with extractAndImport at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from importProfiles import IMPORT_PROFILES, import_init_command
 
 # ─────────────────────────────────────────────────────────────────────────────
 # CLI & CONFIG
 # ─────────────────────────────────────────────────────────────────────────────
 def parse_args():
     ap = argparse.ArgumentParser(description="Combined backup + import with verbose logging and exclusions.")
-    ap.add_argument("--config", required=True, help="Path to config JSON file")
-    return ap.parse_args()
+    ap.add_argument("--config", help="Path to config JSON file")
+    ap.add_argument("--stream", action="store_true", help="Import straight from mysqldump output while archiving it")
+    ap.add_argument("--workers", type=int,
+                    help="Parallel mysql connections for the import (overrides import_workers; default 1, a serial import)")
+    ap.add_argument("--per-table", action="store_true",
+                    help="Back up one compressed file per table with a manifest, and restore from it in parallel")
+    ap.add_argument("--verbose", action="store_true", help="Log every statement sent by the serial importer")
+    ap.add_argument("--import-profile", help="Session settings for the import connections (overrides import_profile)")
+    ap.add_argument("--shadow", action="store_true",
+                    help="Import into a shadow schema while reports keep running, then swap it in with RENAME TABLE")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Per-table refresh of only the tables whose fingerprint changed since the last run")
+    ap.add_argument("--benchmark-classifier", type=int, metavar="MB",
+                    help="Benchmark the statement classifier on a synthetic dump of MB megabytes and exit")
+    args = ap.parse_args()
+    if not args.config and not args.benchmark_classifier:
+        ap.error("--config is required")
+    return args
 
 def load_config(path):
     if not os.path.isfile(path):
@@ -118,6 +142,477 @@ def do_backup(log, user, pwd, host, db_name, out_dir):
     log.info(f"Backup completed: {out_file}")
     return out_file
 
+def stream_backup_and_import(log, user, pwd, host, db_name, out_dir, import_fn):
+    """
+    Run mysqldump once and tee its output into the gzip archive and, through a pipe,
+    into import_fn(stream) - so the dump is imported while it is being taken and no
+    decompressed copy is ever written.
+    """
+    date_str = datetime.datetime.now().strftime("%d-%m-%Y")
+    out_file = os.path.join(out_dir, f"OPENSPECIMEN_PROD_{date_str}.SQL.gz")
+    log.info(f"Starting streaming mysqldump → {out_file} + import")
+    dump_cmd = [
+        "mysqldump", f"-u{user}", f"-p{pwd}", "-h", host,
+        "--skip-lock-tables", "--routines", "--set-gtid-purged=OFF",
+        "--no-tablespaces", db_name
+    ]
+
+    read_fd, write_fd = os.pipe()
+    import_stream = os.fdopen(read_fd, "rb", buffering=COPY_BUFFER_SIZE)
+    dump_rc = []
+
+    def tee():
+        with subprocess.Popen(dump_cmd, stdout=subprocess.PIPE) as proc, \
+             gzip.open(out_file, "wb") as gz, \
+             os.fdopen(write_fd, "wb") as to_import:
+            importing = True
+            while True:
+                data = proc.stdout.read(COPY_BUFFER_SIZE)
+                if not data:
+                    break
+                gz.write(data)
+                if importing:
+                    try:
+                        to_import.write(data)
+                    except BrokenPipeError:
+                        # The importer gave up; keep writing the archive so the backup is still complete
+                        importing = False
+            try:
+                to_import.close()
+            except BrokenPipeError:
+                pass
+        dump_rc.append(proc.returncode)
+
+    tee_thread = threading.Thread(target=tee, name="dump-tee")
+    tee_thread.start()
+    try:
+        import_fn(import_stream)
+    finally:
+        import_stream.close()
+        tee_thread.join()
+
+    if dump_rc and dump_rc[0] != 0:
+        log.error(f"mysqldump exited with code {dump_rc[0]}")
+        sys.exit(1)
+    log.info(f"Backup completed: {out_file}")
+    return out_file
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PER-TABLE BACKUP
+# ─────────────────────────────────────────────────────────────────────────────
+MANIFEST_FILE   = "manifest.json"
+BACKUP_CODECS   = {"gzip": ".sql.gz", "zstd": ".sql.zst"}
+OBJECTS_ENTRY   = "__schema_objects__"
+INSERT_PREFIX   = b"INSERT INTO `"
+ROW_SEPARATOR   = b"),("
+
+def query_rows(log, user, pwd, host, sql, fatal=True):
+    """
+    Run one or more statements with the mysql client and return the result rows as
+    lists of strings. The SQL goes through stdin, so it is not limited by argv size.
+    A failure exits, or returns None when fatal is False.
+    """
+    result = subprocess.run(["mysql", f"-u{user}", f"-p{pwd}", "-h", host, "-N", "-B"],
+                            input=sql, capture_output=True, text=True)
+    if result.returncode != 0:
+        log.error(f"Query failed: {sql[:500]}")
+        for line in result.stderr.strip().splitlines():
+            log.error(line)
+        if fatal:
+            sys.exit(1)
+        return None
+    return [line.split("\t") for line in result.stdout.splitlines()]
+
+# mysql -B escapes these characters inside a value
+BATCH_ESCAPE_RE = re.compile(r"\\([nt0\\])")
+BATCH_ESCAPES = {"n": "\n", "t": "\t", "0": "\0", "\\": "\\"}
+
+def unescape_batch(value):
+    return BATCH_ESCAPE_RE.sub(lambda m: BATCH_ESCAPES[m.group(1)], value)
+
+def list_tables(log, user, pwd, host, db_name):
+    """Return [(name, type, data_length)] for every table and view of a schema, largest first."""
+    rows = query_rows(log, user, pwd, host,
+                      "SELECT TABLE_NAME, TABLE_TYPE, IFNULL(DATA_LENGTH + INDEX_LENGTH, 0) "
+                      f"FROM information_schema.TABLES WHERE TABLE_SCHEMA = '{db_name}'")
+    tables = [(name, table_type, int(size)) for name, table_type, size in rows]
+    return sorted(tables, key=lambda t: t[2], reverse=True)
+
+class CompressedWriter:
+    """Write-only file object compressing into path with gzip (in-process) or the zstd CLI."""
+
+    def __init__(self, path, codec, level):
+        self.proc = None
+        if codec == "gzip":
+            self.f = gzip.open(path, "wb", compresslevel=level)
+        elif codec == "zstd":
+            self.proc = subprocess.Popen(["zstd", f"-{level}", "-q", "-f", "-o", path], stdin=subprocess.PIPE)
+            self.f = self.proc.stdin
+        else:
+            raise ValueError(f"Unknown backup codec: {codec}")
+
+    def write(self, data):
+        self.f.write(data)
+
+    def close(self):
+        self.f.close()
+        if self.proc and self.proc.wait() != 0:
+            raise RuntimeError(f"zstd exited with code {self.proc.returncode}")
+
+def open_compressed(path, codec):
+    """Open a per-table backup file for binary reading, decompressing on the fly."""
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    proc = subprocess.Popen(["zstd", "-dc", "-q", path], stdout=subprocess.PIPE)
+    return proc.stdout
+
+def count_dump_rows(prev, data):
+    """INSERT rows in data, a block of dump text following the block prev."""
+    rows = 0
+    for pattern in (INSERT_PREFIX, ROW_SEPARATOR):
+        # A match split across two reads is the only one in the joined tail + head
+        k = len(pattern) - 1
+        rows += data.count(pattern) + (prev[-k:] + data[:k]).count(pattern)
+    return rows
+
+def copy_counting(src, dst, digest, progress=None):
+    """
+    Copy src to dst, hashing the data and counting INSERT rows. Returns (bytes, rows).
+    progress(bytes, statements, rows, seconds) is called for every block copied.
+    """
+    size = rows = 0
+    prev = b""
+    while True:
+        block_start = time.time()
+        data = src.read(COPY_BUFFER_SIZE)
+        if not data:
+            return size, rows
+        digest.update(data)
+        dst.write(data)
+        size += len(data)
+        block_rows = count_dump_rows(prev, data)
+        rows += block_rows
+        if progress:
+            progress(len(data), data.count(b";\n"), block_rows, time.time() - block_start)
+        prev = data
+
+def dump_to_file(log, dump_cmds, path, codec, level):
+    """Run one or more mysqldump commands into a single compressed file and describe it for the manifest."""
+    digest = hashlib.sha256()
+    size = rows = 0
+    start = time.time()
+    out = CompressedWriter(path, codec, level)
+    try:
+        for cmd in dump_cmds:
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE) as proc:
+                copied, counted = copy_counting(proc.stdout, out, digest)
+            if proc.returncode != 0:
+                raise RuntimeError(f"mysqldump exited with code {proc.returncode}")
+            size += copied
+            rows += counted
+    finally:
+        out.close()
+    return {
+        "file": os.path.basename(path),
+        "bytes": size,
+        "compressed_bytes": os.path.getsize(path),
+        "rows": rows,
+        "sha256": digest.hexdigest(),
+        "seconds": round(time.time() - start, 1),
+    }
+
+def do_backup_per_table(log, user, pwd, host, db_name, out_dir, workers, codec="gzip", level=1, only_tables=None):
+    """
+    Dump every table (or only those in only_tables) on its own mysqldump connection,
+    workers at a time, into one compressed file per table, plus one file for views,
+    routines and triggers. Writes a manifest with the uncompressed size, row count (from the
+    INSERT row groups) and sha256 of each file's SQL, and returns the manifest path.
+
+    Tables are dumped independently, so as with the single-file dump (which also
+    runs with --skip-lock-tables) the backup is not a cross-table snapshot.
+    """
+    date_str = datetime.datetime.now().strftime("%d-%m-%Y")
+    backup_dir = os.path.join(out_dir, f"OPENSPECIMEN_PROD_{date_str}")
+    os.makedirs(backup_dir, exist_ok=True)
+    suffix = BACKUP_CODECS[codec]
+    log.info(f"Starting per-table mysqldump → {backup_dir} ({workers} workers, {codec} level {level})")
+
+    base_cmd = ["mysqldump", f"-u{user}", f"-p{pwd}", "-h", host,
+                "--skip-lock-tables", "--set-gtid-purged=OFF", "--no-tablespaces"]
+    objects = list_tables(log, user, pwd, host, db_name)
+    tables = [name for name, table_type, _ in objects
+              if table_type == "BASE TABLE" and (only_tables is None or name in only_tables)]
+    views = [name for name, table_type, _ in objects if table_type == "VIEW"]
+
+    # Largest tables first so the long dumps start early; the objects file last
+    # Triggers go with the views and routines rather than their table, so a table file
+    # only ever creates a plain table (which RENAME TABLE can move between schemas)
+    tasks = queue.Queue()
+    for table in tables:
+        tasks.put((table, [base_cmd + ["--skip-triggers", db_name, table]]))
+    object_cmds = [base_cmd + ["--no-data", "--no-create-info", "--routines", "--add-drop-trigger", db_name]]
+    if views:
+        object_cmds.insert(0, base_cmd + ["--no-data", "--skip-triggers", db_name] + views)
+    tasks.put((OBJECTS_ENTRY, object_cmds))
+
+    entries, failures = {}, []
+
+    def worker():
+        while True:
+            try:
+                name, cmds = tasks.get_nowait()
+            except queue.Empty:
+                return
+            path = os.path.join(backup_dir, f"{name}{suffix}")
+            try:
+                entries[name] = dump_to_file(log, cmds, path, codec, level)
+                log.info(f"Dumped `{name}`: {entries[name]['bytes']} bytes, ~{entries[name]['rows']} rows "
+                         f"in {entries[name]['seconds']}s")
+            except Exception as e:
+                log.error(f"Dump of `{name}` failed: {e}")
+                failures.append(name)
+
+    threads = [threading.Thread(target=worker, name=f"dump-{i}") for i in range(1, workers + 1)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if failures:
+        log.error(f"Per-table backup failed for: {', '.join(failures)}")
+        sys.exit(1)
+
+    manifest = {
+        "database": db_name,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "codec": codec,
+        "level": level,
+        "tables": {table: entries[table] for table in tables},
+        "objects": entries[OBJECTS_ENTRY],
+    }
+    manifest_path = os.path.join(backup_dir, MANIFEST_FILE)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    total = sum(entry["compressed_bytes"] for entry in entries.values())
+    log.info(f"Backup completed: {len(tables)} tables, {total} compressed bytes, manifest {manifest_path}")
+    return manifest_path
+
+# ─────────────────────────────────────────────────────────────────────────────
+# INCREMENTAL REFRESH
+# ─────────────────────────────────────────────────────────────────────────────
+def checksum_tables(log, user, pwd, host, db_name, tables, workers):
+    """Run CHECKSUM TABLE over tables, split across workers connections. Returns {table: checksum}."""
+    checksums = {}
+
+    def run(batch):
+        sql = "CHECKSUM TABLE " + ", ".join(f"`{db_name}`.`{table}`" for table in batch)
+        for name, checksum in query_rows(log, user, pwd, host, sql):
+            checksums[name.split(".", 1)[1]] = checksum
+
+    batches = [tables[i::workers] for i in range(workers) if tables[i::workers]]
+    threads = [threading.Thread(target=run, args=(batch,), name=f"checksum-{i}")
+               for i, batch in enumerate(batches, start=1)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return checksums
+
+def table_fingerprints(log, user, pwd, host, db_name, excluded_tables, workers, checksum=True):
+    """
+    Fingerprint every non-excluded base table with its information_schema UPDATE_TIME
+    and TABLE_ROWS, plus CHECKSUM TABLE if checksum is set. UPDATE_TIME is reset by a
+    server restart and TABLE_ROWS is an estimate, so the checksum is what makes
+    the comparison trustworthy; a table missing any value always counts as changed.
+    """
+    # MySQL 8 caches these statistics for a day unless told otherwise
+    rows = query_rows(log, user, pwd, host,
+                      "SET SESSION information_schema_stats_expiry = 0; "
+                      "SELECT TABLE_NAME, IFNULL(UPDATE_TIME, ''), IFNULL(TABLE_ROWS, '') "
+                      f"FROM information_schema.TABLES WHERE TABLE_SCHEMA = '{db_name}' AND TABLE_TYPE = 'BASE TABLE'")
+    fingerprints = {
+        name: {"update_time": update_time or None, "rows": table_rows or None, "checksum": None}
+        for name, update_time, table_rows in rows if name not in excluded_tables
+    }
+    if checksum:
+        start = time.time()
+        for name, value in checksum_tables(log, user, pwd, host, db_name, sorted(fingerprints), workers).items():
+            if name in fingerprints:
+                fingerprints[name]["checksum"] = None if value == "NULL" else value
+        log.info(f"Checksummed {len(fingerprints)} tables in {time.time() - start:.1f}s")
+    return fingerprints
+
+def changed_tables(current, stored, checksum=True):
+    """
+    Tables whose fingerprint differs from the stored one, or that have no usable fingerprint.
+    A table with a checksum is compared on the checksum alone: TABLE_ROWS is an InnoDB
+    estimate that moves without writes, and UPDATE_TIME is lost on a server restart.
+    """
+    changed = []
+    for table, fingerprint in current.items():
+        previous = stored.get(table)
+        if previous is None:
+            changed.append(table)
+        elif checksum and fingerprint["checksum"] is not None:
+            if fingerprint["checksum"] != previous.get("checksum"):
+                changed.append(table)
+        elif fingerprint["update_time"] is None or previous != fingerprint:
+            changed.append(table)
+    return changed
+
+def load_fingerprints(path):
+    if not path or not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("tables", {})
+
+def save_fingerprints(path, db_name, fingerprints):
+    """Replace the stored fingerprints atomically, so a crash never leaves a half-written file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "database": db_name,
+            "saved": datetime.datetime.now().isoformat(timespec="seconds"),
+            "tables": fingerprints,
+        }, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# IMPORT TELEMETRY
+# ─────────────────────────────────────────────────────────────────────────────
+class ImportStats:
+    """
+    Aggregated import progress, safe to share between import workers. Totals and
+    per-table bytes, statements, rows and time are reported every interval seconds
+    to the log and, if path is set, as JSON lines; summary() ends the run with a
+    table of the slowest tables.
+    """
+
+    def __init__(self, log, path=None, interval=30, profile=None):
+        self.log = log
+        self.path = path
+        self.interval = interval
+        self.profile = profile
+        self.start = self.last_report = time.time()
+        self.bytes = self.statements = self.rows = 0
+        self.last_bytes = self.last_statements = 0
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def begin(self):
+        """Start the clock when the import actually starts, unless a previous importer already did."""
+        if not self.statements:
+            self.start = self.last_report = time.time()
+
+    def add(self, table, nbytes, statements=1, rows=0, seconds=0.0):
+        with self.lock:
+            self.bytes += nbytes
+            self.statements += statements
+            self.rows += rows
+            if table:
+                totals = self.tables.setdefault(table, {"bytes": 0, "statements": 0, "rows": 0, "seconds": 0.0})
+                totals["bytes"] += nbytes
+                totals["statements"] += statements
+                totals["rows"] += rows
+                totals["seconds"] += seconds
+
+    def maybe_report(self, progress=None):
+        """Report if interval seconds have passed; progress is the fraction of the dump read, if known."""
+        if time.time() - self.last_report >= self.interval:
+            self.report(progress)
+
+    def report(self, progress=None):
+        with self.lock:
+            now = time.time()
+            if now - self.last_report < self.interval:
+                return  # another worker reported in the meantime
+            window = max(now - self.last_report, 1e-6)
+            elapsed = now - self.start
+            record = {
+                "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                "event": "progress",
+                "elapsed_seconds": round(elapsed, 1),
+                "bytes": self.bytes,
+                "statements": self.statements,
+                "rows": self.rows,
+                "tables": len(self.tables),
+                "mb_per_second": round((self.bytes - self.last_bytes) / window / 1048576, 2),
+                "statements_per_second": round((self.statements - self.last_statements) / window, 1),
+            }
+            if progress:
+                record["progress"] = round(progress, 4)
+                record["eta_seconds"] = round(elapsed * (1 - progress) / progress)
+            self.last_report, self.last_bytes, self.last_statements = now, self.bytes, self.statements
+
+        eta = f", {record['progress']:.0%} done, ETA {record['eta_seconds'] // 60}m" if progress else ""
+        self.log.info(f"Progress: {record['bytes'] / 1048576:.0f} MB, {record['statements']} statements, "
+                      f"{record['rows']} rows, {record['tables']} tables in {record['elapsed_seconds']:.0f}s "
+                      f"({record['mb_per_second']} MB/s, {record['statements_per_second']} statements/s){eta}")
+        self.write(record)
+
+    def write(self, record):
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def summary(self, top=25):
+        """Log totals and the top slowest tables, and write every table's totals as one JSON line."""
+        elapsed = time.time() - self.start
+        with self.lock:
+            tables = sorted(self.tables.items(), key=lambda item: item[1]["seconds"], reverse=True)
+            self.write({
+                "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                "event": "summary",
+                "profile": self.profile,
+                "elapsed_seconds": round(elapsed, 1),
+                "bytes": self.bytes,
+                "statements": self.statements,
+                "rows": self.rows,
+                "tables": {name: dict(totals, seconds=round(totals["seconds"], 2)) for name, totals in tables},
+            })
+
+        self.log.info(f"Imported {self.bytes / 1048576:.0f} MB, {self.statements} statements, {self.rows} rows "
+                      f"into {len(tables)} tables in {elapsed:.0f}s")
+        if not tables:
+            return
+        self.log.info("Slowest tables:")
+        self.log.info(f"  {'table':<40} {'rows':>12} {'MB':>9} {'seconds':>9} {'rows/s':>10}")
+        for name, totals in tables[:top]:
+            rate = totals["rows"] / totals["seconds"] if totals["seconds"] else 0
+            self.log.info(f"  {name:<40} {totals['rows']:>12} {totals['bytes'] / 1048576:>9.1f} "
+                          f"{totals['seconds']:>9.1f} {rate:>10.0f}")
+
+def previous_import_seconds(path):
+    """Elapsed seconds of the last import summary in a stats file, per import profile."""
+    seconds = {}
+    if path and os.path.isfile(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("event") == "summary":
+                    seconds[record.get("profile")] = record["elapsed_seconds"]
+    return seconds
+
+def compare_import_time(log, stats, previous):
+    """Log this import's time against the last import with each profile, to measure a profile's gain."""
+    elapsed = time.time() - stats.start
+    log.info(f"Import took {elapsed:.0f}s with import profile '{stats.profile}'")
+    for profile, seconds in sorted(previous.items(), key=lambda item: str(item[0])):
+        if seconds:
+            log.info(f"  last import with profile '{profile}' took {seconds:.0f}s "
+                     f"(this one took {elapsed / seconds:.0%} of that)")
+
+def dump_progress(source, f):
+    """Return a function giving the fraction of a dump file read so far, or None for streams."""
+    if not isinstance(source, str):
+        return lambda: None
+    total = os.path.getsize(source)
+    raw = f.fileobj if isinstance(f, gzip.GzipFile) else f  # compressed position for .gz dumps
+    return lambda: raw.tell() / total if total else None
+
 # ─────────────────────────────────────────────────────────────────────────────
 # IMPORT HELPERS
 # ─────────────────────────────────────────────────────────────────────────────
@@ -127,16 +622,13 @@ def stop_service(log, name):
 def start_service(log, name):
     run_cmd(log, ["systemctl", "start", name])
 
-def gunzip_file(log, gz_path):
-    if not os.path.isfile(gz_path):
-        log.error(f"GZ not found: {gz_path}")
-        sys.exit(1)
-    out_path = gz_path[:-3]
-    log.info(f"Extracting {gz_path} → {out_path}")
-    with gzip.open(gz_path, "rb") as gz, open(out_path, "wb") as out:
-        shutil.copyfileobj(gz, out)
-    log.info(f"Extracted: {out_path}")
-    return out_path
+def open_dump(source):
+    """Open a dump for binary reading; .gz files are decompressed on the fly, never to disk."""
+    if not isinstance(source, str):
+        return source  # already an open binary stream, e.g. a pipe from mysqldump
+    if source.endswith(".gz"):
+        return gzip.open(source, "rb")
+    return open(source, "rb")
 
 def load_excluded_tables(log, config):
     excludes = set()
@@ -157,173 +649,795 @@ def load_excluded_tables(log, config):
     log.info(f"Loaded {len(excludes)} excluded tables.")
     return excludes
 
-# Regexes to identify statement kinds
-CREATE_TABLE_RE     = re.compile(r"^\s*CREATE\s+TABLE\s+`([^`]+)`", re.I | re.S)
-INSERT_INTO_RE      = re.compile(r"^\s*INSERT\s+INTO\s+`([^`]+)`", re.I | re.S)
-CREATE_TRIGGER_RE   = re.compile(r"^\s*CREATE\s+TRIGGER\s+`?([^`\s]+)`?", re.I | re.S)
-CREATE_VIEW_RE      = re.compile(r"^\s*CREATE\s+(?:ALGORITHM=.*?DEFINER=.*?SQL SECURITY .*?\s+)?VIEW\s+`?([^`\s]+)`?", re.I | re.S)
-CREATE_PROC_RE      = re.compile(r"^\s*CREATE\s+PROCEDURE\s+`?([^`\s]+)`?", re.I | re.S)
-CREATE_FUNC_RE      = re.compile(r"^\s*CREATE\s+FUNCTION\s+`?([^`\s]+)`?", re.I | re.S)
-CREATE_EVENT_RE     = re.compile(r"^\s*CREATE\s+EVENT\s+`?([^`\s]+)`?", re.I | re.S)
-DROP_TABLE_RE       = re.compile(r"^\s*DROP\s+TABLE\s+IF\s+EXISTS\s+`([^`]+)`", re.I | re.S)
-ALTER_TABLE_RE      = re.compile(r"^\s*ALTER\s+TABLE\s+`([^`]+)`", re.I | re.S)
-LOCK_TABLE_RE       = re.compile(r"^\s*LOCK\s+TABLES\s+`([^`]+)`", re.I | re.S)
-
-def estimate_insert_rows(stmt):
-    m = INSERT_INTO_RE.search(stmt)
+# One alternation classifies a statement; the name of the group that matched is its kind.
+# It is only ever matched against the first CLASSIFY_PREFIX characters of a statement:
+# extended INSERTs can be megabytes long, but their kind and table are at the start.
+STATEMENT_RE = re.compile(r"""
+    \s*(?:
+        CREATE\s+TABLE\s+`(?P<create_table>[^`]+)`
+      | INSERT\s+INTO\s+`(?P<insert>[^`]+)`
+      | DROP\s+TABLE\s+IF\s+EXISTS\s+`(?P<drop_table>[^`]+)`
+      | ALTER\s+TABLE\s+`(?P<alter_table>[^`]+)`
+      | LOCK\s+TABLES\s+`(?P<lock_table>[^`]+)`
+      | UNLOCK\s+TABLES(?P<unlock_tables>)
+      | CREATE\s+TRIGGER\s+`?(?P<trigger>[^`\s]+)`?
+      | CREATE\s+(?:ALGORITHM=.*?DEFINER=.*?SQL\s+SECURITY\s+.*?\s+)?VIEW\s+`?(?P<view>[^`\s]+)`?
+      | CREATE\s+PROCEDURE\s+`?(?P<procedure>[^`\s]+)`?
+      | CREATE\s+FUNCTION\s+`?(?P<function>[^`\s]+)`?
+      | CREATE\s+EVENT\s+`?(?P<event>[^`\s]+)`?
+      | /\*!500(?:01|03|13|17)\s(?P<versioned>)
+    )""", re.I | re.S | re.X)
+VALUES_RE    = re.compile(rb"\bVALUES\b", re.I)
+
+CLASSIFY_PREFIX = 1024
+
+# Kinds that belong to a single table's DDL + data section
+TABLE_KINDS = {"create_table", "insert", "drop_table", "alter_table", "lock_table"}
+# Views, triggers, routines and events (including the versioned-comment forms
+# mysqldump writes for them) are replayed serially once all tables exist
+DEFERRED_KINDS = {"trigger", "view", "procedure", "function", "event", "versioned"}
+
+STATEMENT_LOG = {
+    "create_table": "Creating table",
+    "insert": "Inserting into",
+    "drop_table": "Dropping table",
+    "alter_table": "Altering table",
+    "lock_table": "Locking table",
+    "trigger": "Creating trigger",
+    "view": "Creating view",
+    "procedure": "Creating procedure",
+    "function": "Creating function",
+    "event": "Creating event",
+}
+
+COPY_BUFFER_SIZE    = 1024 * 1024
+READ_SIZE           = 8 * 1024 * 1024
+
+def classify_statement(stmt):
+    """Return (kind, name) of a statement (bytes), decoding only its first CLASSIFY_PREFIX bytes."""
+    m = STATEMENT_RE.match(bytes(stmt[:CLASSIFY_PREFIX]).decode("utf-8", errors="replace"))
+    if not m:
+        return None, None
+    return m.lastgroup, m.group(m.lastgroup)
+
+def estimate_insert_rows(stmt, offset=0):
+    """
+    Count the row groups of an extended INSERT without decoding or copying it.
+    memoryview has no count(), so a memoryview statement is counted on the buffer
+    underneath it (stmt.obj), offset being where the statement starts in it.
+    """
+    m = VALUES_RE.search(stmt, 0, CLASSIFY_PREFIX) or VALUES_RE.search(stmt)
     if not m:
         return None
-    up = stmt.upper()
-    pos = up.find("VALUES")
-    if pos == -1:
-        return None
-    chunk = stmt[pos:]
-    approx = chunk.count("),(")
-    return (approx + 1) if ")," in chunk else 1
+    if isinstance(stmt, memoryview):
+        return stmt.obj.count(b"),(", offset + m.end(), offset + len(stmt)) + 1
+    return stmt.count(b"),(", m.end()) + 1
 
-def should_skip_table(stmt, excluded):
-    for regex in (CREATE_TABLE_RE, INSERT_INTO_RE, DROP_TABLE_RE, ALTER_TABLE_RE, LOCK_TABLE_RE):
-        m = regex.search(stmt)
-        if m:
-            return m.group(1) in excluded
-    return False
+def should_skip_table(kind, name, excluded):
+    return kind in TABLE_KINDS and name in excluded
 
-def log_statement_kind(log, stmt):
-    m = CREATE_TABLE_RE.search(stmt)
-    if m:
-        log.info(f"Creating table `{m.group(1)}`...")
-        return
-    m = INSERT_INTO_RE.search(stmt)
-    if m:
-        rows = estimate_insert_rows(stmt)
+def is_deferred_statement(kind, delim):
+    return delim != ";" or kind in DEFERRED_KINDS
+
+def log_statement_kind(log, stmt, kind, name, offset=0):
+    if kind == "insert":
+        rows = estimate_insert_rows(stmt, offset)
         if rows is not None:
-            log.info(f"Inserting into `{m.group(1)}` (~{rows} row group{'s' if rows != 1 else ''})...")
+            log.info(f"Inserting into `{name}` (~{rows} row group{'s' if rows != 1 else ''})...")
+            return
+    if kind in STATEMENT_LOG:
+        log.info(f"{STATEMENT_LOG[kind]} `{name}`...")
+
+def benchmark_classifier(total_mb):
+    """
+    Compare the single-pass classifier with the previous approach of trying each
+    per-kind regex over the full statement and uppercasing INSERTs, on a synthetic
+    dump of about total_mb MB made of 1 MB extended INSERTs and table DDL.
+    """
+    legacy_res = [re.compile(pattern, re.I | re.S) for pattern in (
+        r"^\s*CREATE\s+TABLE\s+`([^`]+)`",
+        r"^\s*INSERT\s+INTO\s+`([^`]+)`",
+        r"^\s*CREATE\s+TRIGGER\s+`?([^`\s]+)`?",
+        r"^\s*CREATE\s+(?:ALGORITHM=.*?DEFINER=.*?SQL SECURITY .*?\s+)?VIEW\s+`?([^`\s]+)`?",
+        r"^\s*CREATE\s+PROCEDURE\s+`?([^`\s]+)`?",
+        r"^\s*CREATE\s+FUNCTION\s+`?([^`\s]+)`?",
+        r"^\s*CREATE\s+EVENT\s+`?([^`\s]+)`?",
+        r"^\s*DROP\s+TABLE\s+IF\s+EXISTS\s+`([^`]+)`",
+        r"^\s*ALTER\s+TABLE\s+`([^`]+)`",
+        r"^\s*LOCK\s+TABLES\s+`([^`]+)`",
+    )]
+
+    def legacy_classify(stmt):
+        # should_skip_table + log_statement_kind: each regex tried over the whole statement
+        for regex in legacy_res:
+            if regex.search(stmt):
+                break
+        for regex in legacy_res:
+            m = regex.search(stmt)
+            if m:
+                if regex is legacy_res[1]:
+                    up = stmt.upper()
+                    chunk = stmt[up.find("VALUES"):]
+                    chunk.count("),(")
+                return m.group(1)
+        return None
+
+    def new_classify(stmt):
+        kind, name = classify_statement(stmt)
+        if kind == "insert":
+            estimate_insert_rows(stmt)
+        return name
+
+    row = "(1,'Whole Blood','2024-01-01 10:00:00',NULL,'ACTIVE')"
+    insert = "INSERT INTO `catissue_specimen` VALUES " + ",".join([row] * (1024 * 1024 // (len(row) + 1))) + ";"
+    ddl = ["DROP TABLE IF EXISTS `catissue_specimen`;", "CREATE TABLE `catissue_specimen` (\n  `id` bigint NOT NULL\n);",
+           "LOCK TABLES `catissue_specimen` WRITE;", "UNLOCK TABLES;"]
+    statements = [insert] * max(1, total_mb) + ddl * max(1, total_mb // 10)
+    size_mb = sum(len(stmt) for stmt in statements) / (1024 * 1024)
+    raw_statements = [stmt.encode() for stmt in statements]
+
+    # The legacy code classified decoded text; the classifier now works on the raw dump bytes
+    for label, classify, inputs in (("per-kind regexes", legacy_classify, statements),
+                                    ("single-pass", new_classify, raw_statements)):
+        start = time.perf_counter()
+        for stmt in inputs:
+            classify(stmt)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>16}: {len(statements)} statements, {size_mb:.0f} MB in {elapsed:.2f}s "
+              f"({size_mb / elapsed:.0f} MB/s)")
+
+def write_statement(proc, stmt, delim, flush=False):
+    """Write one statement buffer to a mysql client, wrapped in DELIMITER switches if needed."""
+    try:
+        if delim == ";":
+            proc.stdin.write(stmt)
+            proc.stdin.write(b"\n")
         else:
-            log.info(f"Inserting into `{m.group(1)}`...")
-        return
-    m = CREATE_TRIGGER_RE.search(stmt)
-    if m:
-        log.info(f"Creating trigger `{m.group(1)}`...")
-        return
-    m = CREATE_VIEW_RE.search(stmt)
-    if m:
-        log.info(f"Creating view `{m.group(1)}`...")
-        return
-    m = CREATE_PROC_RE.search(stmt)
-    if m:
-        log.info(f"Creating procedure `{m.group(1)}`...")
-        return
-    m = CREATE_FUNC_RE.search(stmt)
-    if m:
-        log.info(f"Creating function `{m.group(1)}`...")
-        return
-    m = CREATE_EVENT_RE.search(stmt)
-    if m:
-        log.info(f"Creating event `{m.group(1)}`...")
-        return
-    m = DROP_TABLE_RE.search(stmt)
-    if m:
-        log.info(f"Dropping table `{m.group(1)}`...")
-        return
-    m = ALTER_TABLE_RE.search(stmt)
-    if m:
-        log.info(f"Altering table `{m.group(1)}`...")
-        return
-    m = LOCK_TABLE_RE.search(stmt)
-    if m:
-        log.info(f"Locking table `{m.group(1)}`...")
-        return
+            d = delim.encode()
+            proc.stdin.write(b"DELIMITER " + d + b"\n")
+            proc.stdin.write(stmt)
+            proc.stdin.write(b"\n" + d + b"\nDELIMITER ;\n")
+        if flush:
+            proc.stdin.flush()
+    except BrokenPipeError:
+        pass
+
+# Blank and "--" comment lines between statements
+SKIP_LINE_RE = re.compile(rb"[ \t\r]*(?:--[^\n]*)?\n")
+DELIMITER_RE = re.compile(rb"[ \t]*DELIMITER[ \t]+(\S+)[ \t\r]*\n", re.I)
 
-def import_sql_inline_with_logging(log, sql_path, excluded_tables, user, pwd, host, db):
+def statement_end_re(delim):
+    """A delimiter at the end of a line, which is where mysqldump ends every statement."""
+    return re.compile(re.escape(delim.encode()) + rb"[ \t\r]*\n")
+
+def unescaped_quotes(data, start, end):
+    """
+    Count the single quotes in data[start:end] that are not backslash-escaped,
+    i.e. not preceded by an odd number of backslashes. Only uses bytes.count.
+    """
+    quotes = data.count(b"'", start, end)
+    backslashes = 1
+    while True:
+        escaped = data.count(b"\\" * backslashes + b"'", start, end)
+        if not escaped:
+            return quotes
+        quotes += -escaped if backslashes % 2 else escaped
+        backslashes += 1
+
+# mysqldump data statements hold nothing but single-quoted, backslash-escaped
+# values, so quote parity alone finds their end. Anything else is lexed.
+DATA_STATEMENT_RE = re.compile(rb"\s*(?:INSERT|REPLACE)\s", re.I)
+# Where a quoted name or string, or a comment, starts
+SQL_TOKEN_RE = re.compile(rb"['\"`#]|--[ \t\r\n]|/\*")
+SQL_TOKEN_END_RE = {
+    b"'": re.compile(rb"'(?:[^'\\]|\\.)*'", re.S),
+    b'"': re.compile(rb'"(?:[^"\\]|\\.)*"', re.S),
+    b"`": re.compile(rb"`[^`]*`"),
+    b"#": re.compile(rb"#[^\n]*\n"),
+    b"-": re.compile(rb"--[^\n]*\n"),
+    b"/": re.compile(rb"/\*.*?\*/", re.S),
+}
+
+def find_statement_end(data, pos, delim, end_re):
+    """
+    Return the match of the delimiter that ends the statement starting at pos,
+    or None if it is not in data yet.
+    - Under a custom DELIMITER (routine and trigger bodies) the first delimiter at
+      the end of a line ends the statement; bodies may hold comments with stray quotes.
+    - INSERT/REPLACE statements end at the first delimiter with balanced quotes.
+    - Other statements are lexed, skipping comments and '', "" and `` quoting.
+    """
+    if delim != ";":
+        return end_re.search(data, pos)
+
+    scan = pos
+    if DATA_STATEMENT_RE.match(data, pos):
+        quotes = 0
+        while True:
+            m = end_re.search(data, scan)
+            if not m:
+                return None
+            quotes += unescaped_quotes(data, scan, m.start())
+            scan = m.end()
+            if quotes % 2 == 0:
+                return m
+
+    while True:
+        m = end_re.search(data, scan)
+        token = SQL_TOKEN_RE.search(data, scan, m.start() if m else len(data))
+        if not token:
+            return m
+        closed = SQL_TOKEN_END_RE[data[token.start():token.start() + 1]].match(data, token.start())
+        if not closed:
+            return None
+        scan = closed.end()
+
+def iter_statements(log, f, read_size=READ_SIZE):
+    """
+    Split a dump opened in binary mode into statements without decoding it.
+    Yields (statement, delimiter, start offset, end offset, buffer offset), the
+    statement being a memoryview into the read buffer (statement.obj) starting at
+    buffer offset; start and end are offsets in the dump. It ends at a delimiter at the end of a line
+    (see find_statement_end). Comment lines between statements are dropped and
+    DELIMITER switches are consumed. A dump that ends inside a statement is an error.
+    """
+    delim = ";"
+    end_re = statement_end_re(delim)
+    data = b""
+    base = pos = 0  # file offset of data[0]; scan position in data
+    eof = False
+
+    while True:
+        m = SKIP_LINE_RE.match(data, pos)
+        if m:
+            pos = m.end()
+            continue
+
+        m = DELIMITER_RE.match(data, pos)
+        if m:
+            delim = m.group(1).decode()
+            end_re = statement_end_re(delim)
+            log.info(f"Switching SQL DELIMITER to '{delim}'")
+            pos = m.end()
+            continue
+
+        m = find_statement_end(data, pos, delim, end_re)
+        if m:
+            stop = m.start() + len(delim) if delim == ";" else m.start()
+            yield memoryview(data)[pos:stop], delim, base + pos, base + m.end(), pos
+            pos = m.end()
+            continue
+
+        if eof:
+            tail = data[pos:].strip()
+            if tail and not tail.startswith(b"--"):
+                log.error(f"Dump ends inside an unterminated statement at offset {base + pos} "
+                          f"(DELIMITER '{delim}'): {bytes(tail[:200])!r}")
+                sys.exit(1)
+            return
+
+        # Statement runs past the buffer: keep its start and read at least as much again
+        chunk = f.read(max(read_size, len(data) - pos))
+        eof = not chunk
+        data = data[pos:] + chunk
+        base += pos
+        pos = 0
+        if eof and data and not data.endswith(b"\n"):
+            data += b"\n"  # the last statement may end at EOF instead of a newline
+
+def resolve_import_profile(log, name, user, pwd, host):
+    """Return the --init-command every import connection starts with for an import profile."""
+    if name not in IMPORT_PROFILES:
+        log.error(f"Unknown import_profile '{name}', expected one of: {', '.join(IMPORT_PROFILES)}")
+        sys.exit(1)
+
+    init_command, skipped = import_init_command(name, user, pwd, host)
+    for var in skipped:
+        log.info(f"Import profile '{name}': {var} cannot be set here, leaving it unchanged")
+    log.info(f"Import profile '{name}': {init_command or 'server defaults'}")
+    return init_command
+
+def spawn_mysql(user, pwd, host, db, init_command=""):
+    """Start a mysql client reading statements from stdin; its output goes to temp files so it never blocks."""
+    out, err = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+    cmd = ["mysql", f"-u{user}", f"-p{pwd}", "-h", host, db, "-f", "--binary-mode"]
+    if init_command:
+        cmd.append(f"--init-command={init_command}")
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=out, stderr=err)
+    proc.output_files = (out, err)
+    return proc
+
+def finish_mysql(log, proc, name="mysql"):
+    """Close stdin of a mysql client, wait for it and log its output. Returns the exit code."""
+    try:
+        proc.stdin.close()
+    except Exception:
+        pass
+    proc.wait()
+
+    for stream, log_fn in zip(proc.output_files, (log.info, log.warning)):
+        stream.seek(0)
+        for line in stream.read().decode("utf-8", errors="replace").strip().splitlines():
+            log_fn(f"[{name}] {line}")
+        stream.close()
+
+    if proc.returncode != 0:
+        log.error(f"{name} exited with code {proc.returncode}")
+    return proc.returncode
+
+def import_sql_inline_with_logging(log, source, excluded_tables, user, pwd, host, db, defer_objects=False,
+                                   stats=None, verbose=False, init_command=""):
     """
     Execute the SQL file statement-by-statement while logging what is happening.
+    - Reads a plain or .gz dump, or an already open binary stream.
     - Skips excluded tables (DDL + DML + locks).
     - Handles DELIMITER changes for routines/triggers.
+    - Reports aggregated progress through stats; every statement is only logged when verbose.
+    With defer_objects, views, triggers and routines are not run but kept, and a
+    function replaying them into a given schema is returned.
     """
-    log.info(f"Starting inline import from: {sql_path}")
+    log.info(f"Starting inline import from: {source if isinstance(source, str) else 'stream'}")
+    stats = stats or ImportStats(log)
+    stats.begin()
 
-    mysql_proc = subprocess.Popen(
-        ["mysql", f"-u{user}", f"-p{pwd}", "-h", host, db, "-f", "--binary-mode"],
-        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1
-    )
+    mysql_proc = spawn_mysql(user, pwd, host, db, init_command)
     log.info("Spawned mysql client for import (stdin streaming)")
+    header, deferred = [], []
+    seen_table = False
 
-    current_delim = ";"
-    buf = []
-
-    def flush_stmt(stmt):
-        if should_skip_table(stmt, excluded_tables):
-            for regex in (CREATE_TABLE_RE, INSERT_INTO_RE, DROP_TABLE_RE, ALTER_TABLE_RE, LOCK_TABLE_RE):
-                m = regex.search(stmt)
-                if m:
-                    log.info(f"Skipping `{m.group(1)}` as per exclude list.")
-                    break
+    def flush_stmt(stmt, delim, offset):
+        nonlocal seen_table
+        kind, name = classify_statement(stmt)
+        if should_skip_table(kind, name, excluded_tables):
+            log.info(f"Skipping `{name}` as per exclude list.")
             return
-        log_statement_kind(log, stmt)
-        try:
-            mysql_proc.stdin.write(stmt + "\n")
-            mysql_proc.stdin.flush()
-        except BrokenPipeError:
-            pass
-
-    with open(sql_path, "r", encoding="utf-8", errors="ignore") as f:
-        for raw_line in f:
-            line = raw_line.rstrip("\n")
-
-            # DELIMITER switch support
-            if line.strip().upper().startswith("DELIMITER "):
-                parts = line.strip().split()
-                if len(parts) == 2:
-                    current_delim = parts[1]
-                    log.info(f"Switching SQL DELIMITER to '{current_delim}'")
-                else:
-                    log.warning(f"Unrecognized DELIMITER line: {line}")
-                continue
+        if defer_objects:
+            if is_deferred_statement(kind, delim):
+                deferred.append((bytes(stmt), delim))
+                return
+            # Session settings before the first table are replayed with the objects
+            if kind in TABLE_KINDS:
+                seen_table = True
+            elif not seen_table:
+                header.append((bytes(stmt), delim))
+        if verbose:
+            log_statement_kind(log, stmt, kind, name, offset)
+        elif kind == "create_table":
+            log.info(f"Loading `{name}`...")
+        start = time.time()
+        write_statement(mysql_proc, stmt, delim, flush=verbose)
+        rows = (estimate_insert_rows(stmt, offset) or 0) if kind == "insert" else 0
+        stats.add(name if kind in TABLE_KINDS else None, len(stmt), 1, rows, time.time() - start)
 
-            buf.append(line)
+    with open_dump(source) as f:
+        progress = dump_progress(source, f)
+        for stmt, delim, _, _, offset in iter_statements(log, f):
+            flush_stmt(stmt, delim, offset)
+            stats.maybe_report(progress())
+
+    if finish_mysql(log, mysql_proc) != 0:
+        sys.exit(1)
 
-            if current_delim == ";":
-                if line.strip().endswith(";"):
-                    stmt = "\n".join(buf).strip()
-                    buf.clear()
-                    flush_stmt(stmt)
+    log.info("Inline import completed successfully.")
+    stats.summary()
+    if defer_objects:
+        statements = header + deferred
+        return lambda target_db: replay_statements(log, "deferred", statements, user, pwd, host, target_db,
+                                                   init_command)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PARALLEL IMPORT
+# ─────────────────────────────────────────────────────────────────────────────
+def index_dump(log, dump_path, excluded_tables):
+    """
+    Split the dump into three parts without loading it into memory:
+    - header: session settings before the first table, replayed on every connection
+    - segments: (table, start offset, end offset) of each table's DDL + data section,
+      offsets being positions in the decompressed dump
+    - deferred: views, triggers, routines, events and trailing statements, replayed serially
+    Header and deferred statements are copied out of the read buffer so it is not kept alive.
+    """
+    header, segments, deferred = [], [], []
+    current = None
+    seen_table = False
+
+    def close_segment():
+        nonlocal current
+        if current is not None:
+            if current[0] in excluded_tables:
+                log.info(f"Skipping `{current[0]}` as per exclude list.")
             else:
-                if line.strip().endswith(current_delim):
-                    joined = "\n".join(buf)
-                    stmt = re.sub(re.escape(current_delim) + r"\s*$", "", joined.strip())
-                    buf.clear()
-                    flush_stmt(stmt)
-
-    if buf and current_delim == ";":
-        stmt = "\n".join(buf).strip()
-        if stmt:
-            flush_stmt(stmt)
-
-    if mysql_proc.stdin:
-        try:
-            mysql_proc.stdin.close()
-        except Exception:
-            pass
+                segments.append(tuple(current))
+        current = None
 
-    stdout, stderr = mysql_proc.communicate()
-    if stdout:
-        for line in stdout.strip().splitlines():
-            log.info(line)
-    if stderr:
-        for line in stderr.strip().splitlines():
-            log.warning(line)
+    with open_dump(dump_path) as f:
+        for stmt, delim, start, end, _ in iter_statements(log, f):
+            kind, name = classify_statement(stmt)
+            if is_deferred_statement(kind, delim):
+                close_segment()
+                deferred.append((bytes(stmt), delim))
+                continue
+
+            table = name if kind in TABLE_KINDS else None
+            if table:
+                seen_table = True
+                if current is None or current[0] != table:
+                    close_segment()
+                    current = [table, start, end]
+                else:
+                    current[2] = end
+            elif current is not None:
+                current[2] = end
+                if kind == "unlock_tables":
+                    close_segment()
+            elif not seen_table:
+                header.append((bytes(stmt), delim))
+            else:
+                deferred.append((bytes(stmt), delim))
+    close_segment()
+
+    log.info(f"Indexed dump: {len(header)} header statements, {len(segments)} table segments, "
+             f"{len(deferred)} deferred statements.")
+    return header, segments, deferred
+
+def assign_segments(segments, workers):
+    """
+    Spread table segments over workers, largest first onto the least loaded worker.
+    Each worker then gets its segments in dump order, so it only ever seeks forward.
+    Seeking needs an uncompressed dump: GzipFile.seek inflates everything before the
+    target, so import_sql_parallel spools a .gz dump to disk first.
+    """
+    loads = [[0, []] for _ in range(workers)]
+    for segment in sorted(segments, key=lambda seg: seg[2] - seg[1], reverse=True):
+        load = min(loads, key=lambda l: l[0])
+        load[0] += segment[2] - segment[1]
+        load[1].append(segment)
+    return [sorted(assigned, key=lambda seg: seg[1]) for _, assigned in loads]
+
+def restore_segments(log, name, dump_path, header, segments, user, pwd, host, db, failures, stats, init_command=""):
+    """Worker: replay the header, then its table segments, on one mysql connection."""
+    proc = spawn_mysql(user, pwd, host, db, init_command)
+    for stmt, delim in header:
+        write_statement(proc, stmt, delim)
+
+    with open_dump(dump_path) as f:
+        for table, start, end in segments:
+            log.info(f"[{name}] Restoring `{table}` ({end - start} bytes)...")
+            seg_start = time.time()
+            f.seek(start)
+            remaining = end - start
+            prev = b""
+            try:
+                while remaining > 0:
+                    block_start = time.time()
+                    data = f.read(min(remaining, COPY_BUFFER_SIZE))
+                    if not data:
+                        break
+                    proc.stdin.write(data)
+                    remaining -= len(data)
+                    stats.add(table, len(data), data.count(b";\n"), count_dump_rows(prev, data),
+                              time.time() - block_start)
+                    stats.maybe_report()
+                    prev = data
+                proc.stdin.write(b"\n")
+            except BrokenPipeError:
+                log.error(f"[{name}] mysql client exited while restoring `{table}`")
+                break
+            log.info(f"[{name}] Sent `{table}` in {time.time() - seg_start:.1f}s")
+
+    if finish_mysql(log, proc, name) != 0:
+        failures.append(name)
+
+def replay_statements(log, name, statements, user, pwd, host, db, init_command=""):
+    """Run (statement, delimiter) pairs serially on one mysql connection. Returns True on success."""
+    proc = spawn_mysql(user, pwd, host, db, init_command)
+    for stmt, delim in statements:
+        log_statement_kind(log, stmt, *classify_statement(stmt))
+        write_statement(proc, stmt, delim)
+    return finish_mysql(log, proc, name) == 0
+
+def spool_dump(log, dump_path):
+    """Decompress a .gz dump to a temp file in the same directory and return its path."""
+    fd, path = tempfile.mkstemp(prefix=".restore_", suffix=".sql", dir=os.path.dirname(os.path.abspath(dump_path)))
+    start = time.time()
+    with gzip.open(dump_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    log.info(f"Decompressed {dump_path} to {path} ({os.path.getsize(path) / (1024 * 1024):.0f} MB) "
+             f"in {time.time() - start:.1f}s for the parallel restore")
+    return path
+
+def import_sql_parallel(log, dump_path, excluded_tables, user, pwd, host, db, workers, defer_objects=False,
+                        stats=None, init_command=""):
+    """
+    Restore independent tables on several mysql connections at once, then replay
+    views, triggers, routines and events serially once all tables exist.
+    With defer_objects, the replay is returned as a function of the target schema instead.
+    A .gz dump is decompressed once to a temp file next to it, as workers seek into it;
+    main only does that when parallel_spool_dump is set.
+    """
+    log.info(f"Starting parallel import from: {dump_path} with {workers} connections")
+    stats = stats or ImportStats(log)
+    stats.begin()
+    spooled = spool_dump(log, dump_path) if dump_path.endswith(".gz") else None
+    source = spooled or dump_path
+    try:
+        header, segments, deferred = index_dump(log, source, excluded_tables)
+
+        failures = []
+        threads = [
+            threading.Thread(target=restore_segments, name=f"worker-{i}",
+                             args=(log, f"worker-{i}", source, header, assigned, user, pwd, host, db, failures, stats,
+                                   init_command))
+            for i, assigned in enumerate(assign_segments(segments, workers), start=1)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if failures:
+            log.error(f"Parallel table restore failed on: {', '.join(failures)}")
+            sys.exit(1)
+        stats.summary()
+        if defer_objects:
+            log.info("All table segments restored.")
+            return lambda target_db: replay_statements(log, "deferred", header + deferred, user, pwd, host,
+                                                       target_db, init_command)
+        log.info("All table segments restored, replaying deferred statements.")
+
+        if not replay_statements(log, "deferred", header + deferred, user, pwd, host, db, init_command):
+            sys.exit(1)
 
-    if mysql_proc.returncode != 0:
-        log.error(f"mysql exited with code {mysql_proc.returncode}")
+        log.info("Parallel import completed successfully.")
+    finally:
+        if spooled:
+            os.remove(spooled)
+
+def restore_backup_file(log, name, path, codec, entry, user, pwd, host, db, stats=None, init_command=""):
+    """Pipe one decompressed per-table file into its own mysql client, checking it against the manifest."""
+    proc = spawn_mysql(user, pwd, host, db, init_command)
+    digest = hashlib.sha256()
+    start = time.time()
+
+    def progress(nbytes, statements, rows, seconds):
+        if stats:
+            stats.add(name, nbytes, statements, rows, seconds)
+            stats.maybe_report()
+
+    try:
+        with open_compressed(path, codec) as f:
+            size, rows = copy_counting(f, proc.stdin, digest, progress)
+    except BrokenPipeError:
+        log.error(f"mysql client exited while restoring `{name}`")
+        size = rows = None
+    ok = finish_mysql(log, proc, name) == 0 and size is not None
+    if ok and (digest.hexdigest() != entry["sha256"] or size != entry["bytes"]):
+        log.error(f"`{name}` does not match the manifest: {size} bytes (expected {entry['bytes']}), "
+                  f"sha256 {digest.hexdigest()} (expected {entry['sha256']})")
+        ok = False
+    if ok:
+        log.info(f"Restored `{name}`: ~{rows} rows in {time.time() - start:.1f}s")
+    return ok
+
+def import_backup_manifest(log, manifest_path, excluded_tables, user, pwd, host, db, workers, defer_objects=False,
+                           stats=None, init_command=""):
+    """
+    Restore a per-table backup: the table files on several mysql connections at once,
+    largest first, then views, routines and triggers once all tables exist. Every file
+    is checked against the size and sha256 recorded in the manifest as it is read.
+    With defer_objects, the objects restore is returned as a function of the target schema instead.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    backup_dir = os.path.dirname(manifest_path)
+    codec = manifest["codec"]
+    log.info(f"Starting manifest import from: {manifest_path} with {workers} connections")
+    stats = stats or ImportStats(log)
+    stats.begin()
+
+    tasks = queue.Queue()
+    for table, entry in sorted(manifest["tables"].items(), key=lambda item: item[1]["bytes"], reverse=True):
+        if table in excluded_tables:
+            log.info(f"Skipping `{table}` as per exclude list.")
+            continue
+        tasks.put((table, entry))
+
+    failures = []
+
+    def worker():
+        while True:
+            try:
+                table, entry = tasks.get_nowait()
+            except queue.Empty:
+                return
+            path = os.path.join(backup_dir, entry["file"])
+            if not restore_backup_file(log, table, path, codec, entry, user, pwd, host, db, stats, init_command):
+                failures.append(table)
+
+    threads = [threading.Thread(target=worker, name=f"worker-{i}") for i in range(1, workers + 1)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if failures:
+        log.error(f"Manifest restore failed for: {', '.join(failures)}")
         sys.exit(1)
+    stats.summary()
+    objects = manifest["objects"]
+    objects_path = os.path.join(backup_dir, objects["file"])
+    if defer_objects:
+        log.info("All tables restored.")
+        return lambda target_db: restore_backup_file(log, "objects", objects_path, codec, objects,
+                                                     user, pwd, host, target_db, init_command=init_command)
+    log.info("All tables restored, restoring views, routines and triggers.")
 
-    log.info("Inline import completed successfully.")
+    if not restore_backup_file(log, "objects", objects_path, codec, objects, user, pwd, host, db,
+                               init_command=init_command):
+        sys.exit(1)
+
+    log.info("Manifest import completed successfully.")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SHADOW SCHEMA SWAP
+# ─────────────────────────────────────────────────────────────────────────────
+def schema_objects(log, user, pwd, host, db_name, table_type):
+    rows = query_rows(log, user, pwd, host,
+                      "SELECT TABLE_NAME FROM information_schema.TABLES "
+                      f"WHERE TABLE_SCHEMA = '{db_name}' AND TABLE_TYPE = '{table_type}'")
+    return sorted(row[0] for row in rows)
+
+def count_rows(log, user, pwd, host, db_name, tables, batch_size=200):
+    """Exact COUNT(*) of each table, a batch of tables per query."""
+    counts = {}
+    for i in range(0, len(tables), batch_size):
+        sql = "\nUNION ALL\n".join(f"SELECT '{table}', COUNT(*) FROM `{db_name}`.`{table}`"
+                                   for table in tables[i:i + batch_size])
+        for table, count in query_rows(log, user, pwd, host, sql + ";"):
+            counts[table] = int(count)
+    return counts
+
+def table_triggers(log, user, pwd, host, db_name, tables):
+    """Names of the triggers on the given tables of a schema."""
+    rows = query_rows(log, user, pwd, host,
+                      "SELECT TRIGGER_NAME, EVENT_OBJECT_TABLE FROM information_schema.TRIGGERS "
+                      f"WHERE TRIGGER_SCHEMA = '{db_name}' ORDER BY ACTION_ORDER")
+    return [name for name, table in rows if table in tables]
+
+def drop_triggers_sql(log, user, pwd, host, db_name, tables):
+    """
+    DROP TRIGGER statements for the triggers on tables: RENAME TABLE cannot move
+    a table with triggers to another schema. They are recreated with the objects.
+    """
+    return "".join(f"DROP TRIGGER `{db_name}`.`{name}`;\n"
+                   for name in table_triggers(log, user, pwd, host, db_name, tables))
+
+def save_live_objects(log, user, pwd, host, db_name, views, triggers):
+    """
+    Capture SHOW CREATE VIEW and SHOW CREATE TRIGGER for the objects the swap drops
+    from db_name, as (statement, delimiter) pairs in an order they can be replayed in.
+    """
+    definitions = {}
+    if views:
+        rows = query_rows(log, user, pwd, host, "".join(f"SHOW CREATE VIEW `{db_name}`.`{view}`;\n" for view in views))
+        definitions = {view: unescape_batch(row[1]) for view, row in zip(views, rows)}
+
+    # Views are stored with qualified names, so one that uses another names it as `db`.`view`
+    statements = []
+    pending = dict(definitions)
+    while pending:
+        ready = [view for view, sql in pending.items()
+                 if not any(f"`{db_name}`.`{other}`" in sql for other in pending if other != view)] or list(pending)
+        for view in ready:
+            statements.append((f"DROP VIEW IF EXISTS `{view}`;".encode(), ";"))
+            statements.append((pending.pop(view).encode() + b";", ";"))
+
+    if triggers:
+        rows = query_rows(log, user, pwd, host,
+                          "".join(f"SHOW CREATE TRIGGER `{db_name}`.`{trigger}`;\n" for trigger in triggers))
+        for trigger, (_, sql_mode, sql, *_) in zip(triggers, rows):
+            statements.append((f"DROP TRIGGER IF EXISTS `{trigger}`;".encode(), ";"))
+            statements.append((f"SET SESSION sql_mode = '{sql_mode}';".encode(), ";"))
+            statements.append((unescape_batch(sql).encode(), ";;"))
+    return statements
+
+def restore_live_objects(log, user, pwd, host, db_name, saved):
+    """Replace whatever views db_name has now with the saved views and triggers. Returns True on success."""
+    log.info(f"Recreating the original views and triggers of `{db_name}`")
+    drops = [(f"DROP VIEW IF EXISTS `{view}`;".encode(), ";")
+             for view in schema_objects(log, user, pwd, host, db_name, "VIEW")]
+    if replay_statements(log, "restore-objects", drops + saved, user, pwd, host, db_name):
+        return True
+    log.error(f"Could not recreate all original views and triggers of `{db_name}`")
+    return False
+
+def prepare_shadow_schema(log, user, pwd, host, shadow_db):
+    log.info(f"Recreating shadow schema `{shadow_db}`")
+    query_rows(log, user, pwd, host, f"DROP DATABASE IF EXISTS `{shadow_db}`; CREATE DATABASE `{shadow_db}`;")
+
+def rename_sql(pairs):
+    return "RENAME TABLE " + ",\n  ".join(f"{src} TO {dst}" for src, dst in pairs) + ";\n"
+
+def swap_shadow_schema(log, user, pwd, host, live_db, shadow_db, replay_objects, service):
+    """
+    Move the freshly imported tables from shadow_db into live_db with one RENAME TABLE
+    (atomic across all tables), parking the tables they replace in <live_db>_old, then
+    recreate views, routines and triggers in live_db. The service is only stopped for
+    that swap. Row counts are then checked against the shadow copy; on a mismatch the
+    swap is reversed, otherwise the old tables and the shadow schema are dropped.
+    The live views and triggers are saved first and put back if the swap fails or is reversed.
+    """
+    old_db = f"{live_db}_old"
+    tables = schema_objects(log, user, pwd, host, shadow_db, "BASE TABLE")
+    if not tables:
+        log.error(f"Shadow schema `{shadow_db}` has no tables; not swapping")
+        sys.exit(1)
+
+    log.info(f"Counting rows of {len(tables)} shadow tables before the swap")
+    expected = count_rows(log, user, pwd, host, shadow_db, tables)
+    live_tables = set(schema_objects(log, user, pwd, host, live_db, "BASE TABLE"))
+    live_views = schema_objects(log, user, pwd, host, live_db, "VIEW")
+    # Kept so any failure below can put back the objects the swap drops
+    saved = save_live_objects(log, user, pwd, host, live_db, live_views,
+                              table_triggers(log, user, pwd, host, live_db, live_tables & set(tables)))
+    query_rows(log, user, pwd, host, f"DROP DATABASE IF EXISTS `{old_db}`; CREATE DATABASE `{old_db}`;")
+
+    swap_in, swap_back = [], []
+    for table in tables:
+        if table in live_tables:
+            swap_in.append((f"`{live_db}`.`{table}`", f"`{old_db}`.`{table}`"))
+            swap_back.append((f"`{old_db}`.`{table}`", f"`{live_db}`.`{table}`"))
+        swap_in.append((f"`{shadow_db}`.`{table}`", f"`{live_db}`.`{table}`"))
+        swap_back.insert(0, (f"`{live_db}`.`{table}`", f"`{shadow_db}`.`{table}`"))
+
+    # Views are dropped as well: the new dump recreates them, and a view would block
+    # a shadow placeholder table of the same name from being renamed in
+    swap_sql = (drop_triggers_sql(log, user, pwd, host, live_db, live_tables & set(tables))
+                + "".join(f"DROP VIEW `{live_db}`.`{view}`;\n" for view in live_views)
+                + rename_sql(swap_in))
+
+    log.info(f"Swapping {len(tables)} tables from `{shadow_db}` into `{live_db}`")
+    stop_service(log, service)
+    start = time.time()
+    try:
+        if query_rows(log, user, pwd, host, swap_sql, fatal=False) is None:
+            log.error(f"Swap failed; `{live_db}` keeps its tables")
+            restore_live_objects(log, user, pwd, host, live_db, saved)
+            sys.exit(1)
+        objects_ok = replay_objects(live_db)
+    finally:
+        start_service(log, service)
+    log.info(f"Swap completed; reports service was down for {time.time() - start:.1f}s")
+
+    actual = count_rows(log, user, pwd, host, live_db, tables)
+    mismatched = [t for t in tables if actual.get(t) != expected.get(t)]
+    if mismatched or not objects_ok:
+        for table in mismatched:
+            log.error(f"Row count mismatch for `{table}`: {actual.get(table)} live, {expected.get(table)} imported")
+        if not objects_ok:
+            log.error("Recreating views, routines and triggers failed")
+        log.error(f"Reverting the swap; `{shadow_db}` and `{old_db}` are kept for inspection")
+        stop_service(log, service)
+        try:
+            query_rows(log, user, pwd, host,
+                       drop_triggers_sql(log, user, pwd, host, live_db, set(tables)) + rename_sql(swap_back))
+            restore_live_objects(log, user, pwd, host, live_db, saved)
+        finally:
+            start_service(log, service)
+        sys.exit(1)
+
+    log.info(f"Row counts verified for {len(tables)} tables; dropping `{old_db}` and `{shadow_db}`")
+    query_rows(log, user, pwd, host, f"DROP DATABASE `{old_db}`; DROP DATABASE `{shadow_db}`;")
 
 # ─────────────────────────────────────────────────────────────────────────────
 # MAIN
 # ─────────────────────────────────────────────────────────────────────────────
 def main():
     args = parse_args()
+    if args.benchmark_classifier:
+        benchmark_classifier(args.benchmark_classifier)
+        return
+
     cfg = load_config(args.config)
 
     # Required config keys
@@ -352,6 +1466,66 @@ def main():
     temp_dir = tmp_backup_dir(cfg["backup_dir"])
     log.info(f"Temp backup directory: {temp_dir}")
 
+    excluded = load_excluded_tables(log, cfg)
+    # import_workers > 1 restores several tables at once; 1 (the default) keeps the serial import
+    workers = args.workers or int(cfg.get("import_workers", 1))
+    # A single .gz dump can only be restored in parallel from a decompressed copy on disk
+    spool_dump_allowed = cfg.get("parallel_spool_dump", False)
+    stream = args.stream or cfg.get("stream_import", False)
+    incremental = args.incremental or cfg.get("incremental", False)
+    per_table = incremental or args.per_table or cfg.get("per_table_backup", False)
+    fingerprint_file = cfg.get("fingerprint_file", os.path.join(cfg["backup_dir"], "table_fingerprints.json"))
+    use_checksum = cfg.get("incremental_checksum", True)
+    backup_workers = int(cfg.get("backup_workers", 4))
+    backup_codec = cfg.get("backup_codec", "gzip")
+    backup_level = int(cfg.get("backup_level", 1))
+    if per_table and backup_codec not in BACKUP_CODECS:
+        log.error(f"Unknown backup_codec '{backup_codec}', expected one of: {', '.join(BACKUP_CODECS)}")
+        sys.exit(1)
+    if per_table and stream:
+        log.warning("Per-table backup cannot be streamed; stream_import is ignored")
+        stream = False
+    if workers > 1 and not per_table and not stream and not spool_dump_allowed:
+        log.warning("A parallel restore of the single dump needs a decompressed copy on disk; "
+                    "importing serially (use per_table_backup, or set parallel_spool_dump to allow the copy)")
+        workers = 1
+    shadow = args.shadow or cfg.get("shadow_swap", False)
+    import_db = cfg.get("shadow_db_name", f"{cfg['report_db_name']}_shadow") if shadow else cfg["report_db_name"]
+    replay_objects = None
+    verbose = args.verbose or cfg.get("verbose_import", False)
+    stats_file = cfg.get("stats_file", os.path.splitext(cfg["log_file"])[0] + "_stats.jsonl")
+    import_profile = args.import_profile or cfg.get("import_profile", "default")
+    init_command = resolve_import_profile(log, import_profile,
+                                          cfg["report_db_user"], cfg["report_db_password"], cfg["report_db_host"])
+    previous_seconds = previous_import_seconds(stats_file)
+    stats = ImportStats(log, stats_file, int(cfg.get("stats_interval_seconds", 30)), import_profile)
+    log.info(f"Import statistics → {stats_file}")
+
+    def run_import(source):
+        # In shadow mode views, routines and triggers are kept back until the swap
+        nonlocal replay_objects
+        if per_table:
+            replay_objects = import_backup_manifest(
+                log, source, excluded,
+                cfg["report_db_user"], cfg["report_db_password"],
+                cfg["report_db_host"], import_db,
+                max(workers, 1), shadow, stats, init_command
+            )
+        elif workers > 1 and isinstance(source, str):
+            replay_objects = import_sql_parallel(
+                log, source, excluded,
+                cfg["report_db_user"], cfg["report_db_password"],
+                cfg["report_db_host"], import_db,
+                workers, shadow, stats, init_command
+            )
+        else:
+            replay_objects = import_sql_inline_with_logging(
+                log, source, excluded,
+                cfg["report_db_user"], cfg["report_db_password"],
+                cfg["report_db_host"], import_db,
+                shadow, stats, verbose, init_command
+            )
+
     # Flip RDS MAX_EXECUTION_TIME around export
     log.info("Setting RDS MAX_EXECUTION_TIME=0 (pre-export)")
     set_rds_max_exec_time_val = 0
@@ -359,35 +1533,93 @@ def main():
     time.sleep(60)
     show_max_exec(log, cfg["backup_db_user"], cfg["backup_db_password"], cfg["backup_db_host"])
 
+    success = False
+    service_stopped = False
     try:
-        gz_path = do_backup(
-            log,
-            cfg["backup_db_user"], cfg["backup_db_password"],
-            cfg["backup_db_host"], cfg["backup_db_name"],
-            temp_dir
-        )
-    finally:
-        log.info("Restoring RDS MAX_EXECUTION_TIME=60000 (post-export)")
-        set_rds_max_exec_time(log, cfg["aws_db_parameter_group"], 60000)
-        time.sleep(60)
-        show_max_exec(log, cfg["backup_db_user"], cfg["backup_db_password"], cfg["backup_db_host"])
+        if shadow:
+            prepare_shadow_schema(log, cfg["report_db_user"], cfg["report_db_password"],
+                                  cfg["report_db_host"], import_db)
+        elif stream:
+            # The dump is imported while it is taken, so the service is down for the export too
+            log.info("Streaming mode: importing directly from mysqldump output")
+            stop_service(log, cfg["report_service"])
+            service_stopped = True
+
+        try:
+            if stream:
+                stream_backup_and_import(
+                    log,
+                    cfg["backup_db_user"], cfg["backup_db_password"],
+                    cfg["backup_db_host"], cfg["backup_db_name"],
+                    temp_dir, run_import
+                )
+            elif per_table:
+                only_tables = None
+                unchanged = False
+                if incremental:
+                    fingerprints = table_fingerprints(
+                        log,
+                        cfg["backup_db_user"], cfg["backup_db_password"],
+                        cfg["backup_db_host"], cfg["backup_db_name"],
+                        excluded, backup_workers, use_checksum
+                    )
+                    only_tables = set(changed_tables(fingerprints, load_fingerprints(fingerprint_file), use_checksum))
+                    log.info(f"Incremental refresh: {len(only_tables)} of {len(fingerprints)} tables changed")
+                    unchanged = not only_tables
+                if not unchanged:
+                    manifest_path = do_backup_per_table(
+                        log,
+                        cfg["backup_db_user"], cfg["backup_db_password"],
+                        cfg["backup_db_host"], cfg["backup_db_name"],
+                        temp_dir, backup_workers, backup_codec, backup_level, only_tables
+                    )
+            else:
+                gz_path = do_backup(
+                    log,
+                    cfg["backup_db_user"], cfg["backup_db_password"],
+                    cfg["backup_db_host"], cfg["backup_db_name"],
+                    temp_dir
+                )
+        finally:
+            log.info("Restoring RDS MAX_EXECUTION_TIME=60000 (post-export)")
+            set_rds_max_exec_time(log, cfg["aws_db_parameter_group"], 60000)
+            time.sleep(60)
+            show_max_exec(log, cfg["backup_db_user"], cfg["backup_db_password"], cfg["backup_db_host"])
 
-    # Import phase
-    stop_service(log, cfg["report_service"])
+        if per_table and unchanged:
+            # Nothing to restore: the objects file, the service restart and the swap are skipped too
+            if shadow:
+                query_rows(log, cfg["report_db_user"], cfg["report_db_password"], cfg["report_db_host"],
+                           f"DROP DATABASE IF EXISTS `{import_db}`;")
+            save_fingerprints(fingerprint_file, cfg["backup_db_name"], fingerprints)
+            success = True
+            log.info("No table changed since the last refresh; the reporting database is up to date.")
+            return
+
+        # Import phase, reading the .gz directly rather than a decompressed copy
+        if not stream:
+            if not shadow:
+                stop_service(log, cfg["report_service"])
+                service_stopped = True
+            run_import(manifest_path if per_table else gz_path)
+        compare_import_time(log, stats, previous_seconds)
+
+        if shadow:
+            swap_shadow_schema(
+                log,
+                cfg["report_db_user"], cfg["report_db_password"], cfg["report_db_host"],
+                cfg["report_db_name"], import_db, replay_objects, cfg["report_service"]
+            )
+
+        # Only remember the fingerprints once the changed tables are actually loaded
+        if incremental:
+            save_fingerprints(fingerprint_file, cfg["backup_db_name"], fingerprints)
 
-    success = False
-    try:
-        sql_path = gunzip_file(log, gz_path)
-        excluded = load_excluded_tables(log, cfg)
-        import_sql_inline_with_logging(
-            log, sql_path, excluded,
-            cfg["report_db_user"], cfg["report_db_password"],
-            cfg["report_db_host"], cfg["report_db_name"]
-        )
         success = True
         log.info("Database import completed.")
     finally:
-        start_service(log, cfg["report_service"])
+        if service_stopped:
+            start_service(log, cfg["report_service"])
         if success:
             log.info(f"Import succeeded. Deleting temporary backup directory: {temp_dir}")
             shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,163 @@
+import io
+import logging
+import unittest
+from unittest import mock
+
+import backup_and_import as bi
+
+LOG = logging.getLogger("test_backup_and_import")
+
+DUMP = b"""-- MySQL dump
+/*!40101 SET NAMES utf8mb4 */;
+DROP TABLE IF EXISTS `a`;
+CREATE TABLE `a` (
+  `id` int NOT NULL,
+  `note` varchar(64) DEFAULT NULL COMMENT 'it''s a note; really'
+);
+LOCK TABLES `a` WRITE;
+INSERT INTO `a` VALUES (1,'x;\\n'),(2,'it\\'s'),(3,'back\\\\');
+UNLOCK TABLES;
+/*!50003 SET sql_mode = '' */ ;
+DELIMITER ;;
+/*!50003 CREATE*/ /*!50003 TRIGGER `a_bi` BEFORE INSERT ON `a` FOR EACH ROW BEGIN
+  -- can't touch this
+  SET NEW.note = 'x';
+END */;;
+DELIMITER ;
+DROP TABLE IF EXISTS `b`;
+CREATE TABLE `b` (`id` int NOT NULL);
+INSERT INTO `b` VALUES (1),(2);
+DELIMITER ;;
+CREATE PROCEDURE `p1`()
+BEGIN
+  -- don't do this
+  SELECT 1;
+END ;;
+CREATE PROCEDURE `p2`()
+BEGIN
+  # "quoted" and `ticked
+  SELECT 2;
+END ;;
+DELIMITER ;
+SELECT "double; \\" quoted", `odd``name;` FROM dual;
+-- Dump completed
+"""
+
+class IterStatementsTest(unittest.TestCase):
+
+    def split(self, dump, read_size=bi.READ_SIZE):
+        return [(bytes(stmt), delim) for stmt, delim, _, _, _ in bi.iter_statements(LOG, io.BytesIO(dump), read_size)]
+
+    def test_comment_apostrophes_do_not_swallow_later_statements(self):
+        for read_size in (bi.READ_SIZE, 7):
+            statements = self.split(DUMP, read_size)
+            kinds = [bi.classify_statement(stmt) for stmt, _ in statements]
+            self.assertTrue(any(b"TRIGGER `a_bi`" in stmt and delim == ";;" for stmt, delim in statements))
+            self.assertIn(("drop_table", "b"), kinds)
+            self.assertIn(("insert", "b"), kinds)
+            self.assertIn(("procedure", "p1"), kinds)
+            self.assertIn(("procedure", "p2"), kinds)
+            self.assertEqual(len(statements), 14)
+            self.assertTrue(statements[-1][0].startswith(b'SELECT "double; \\" quoted"'))
+
+    def test_quoted_delimiters_stay_inside_statements(self):
+        statements = {bi.classify_statement(stmt): stmt for stmt, _ in self.split(DUMP)}
+        self.assertTrue(statements[("insert", "a")].endswith(b"(3,'back\\\\');"))
+        self.assertIn(b"COMMENT 'it''s a note; really'", statements[("create_table", "a")])
+
+    def test_routine_bodies_keep_their_delimiter(self):
+        routines = [(stmt, delim) for stmt, delim in self.split(DUMP) if delim != ";"]
+        self.assertEqual([delim for _, delim in routines], [";;"] * 3)
+        self.assertTrue(routines[1][0].rstrip().endswith(b"END"))
+
+    def test_insert_rows_counted_in_place(self):
+        for stmt, _, _, _, offset in bi.iter_statements(LOG, io.BytesIO(DUMP)):
+            if bi.classify_statement(stmt) == ("insert", "a"):
+                self.assertEqual(bi.estimate_insert_rows(stmt, offset), 3)
+                self.assertEqual(bi.estimate_insert_rows(bytes(stmt)), 3)
+
+    def test_statement_without_trailing_newline(self):
+        self.assertEqual(self.split(b"SELECT 1;"), [(b"SELECT 1;", ";")])
+
+    def test_unterminated_statement_fails(self):
+        with self.assertRaises(SystemExit):
+            self.split(b"INSERT INTO `a` VALUES ('never closed);\n")
+        with self.assertRaises(SystemExit):
+            self.split(b"DELIMITER ;;\nCREATE PROCEDURE `p`() BEGIN SELECT 1; END\n")
+
+class ChangedTablesTest(unittest.TestCase):
+
+    STORED = {
+        "a": {"update_time": "2024-01-01 00:00:00", "rows": "100", "checksum": "111"},
+        "b": {"update_time": "2024-01-01 00:00:00", "rows": "50", "checksum": None},
+    }
+
+    def test_row_estimate_drift_is_ignored_when_checksummed(self):
+        current = {"a": {"update_time": None, "rows": "97", "checksum": "111"}}
+        self.assertEqual(bi.changed_tables(current, self.STORED), [])
+        current["a"]["checksum"] = "222"
+        self.assertEqual(bi.changed_tables(current, self.STORED), ["a"])
+
+    def test_without_checksum_every_value_counts(self):
+        current = {"b": {"update_time": "2024-01-01 00:00:00", "rows": "51", "checksum": None},
+                   "c": {"update_time": "2024-01-01 00:00:00", "rows": "1", "checksum": None}}
+        self.assertEqual(bi.changed_tables(current, self.STORED), ["b", "c"])
+        current = {"a": {"update_time": None, "rows": "100", "checksum": "111"}}
+        self.assertEqual(bi.changed_tables(current, self.STORED, checksum=False), ["a"])
+
+class SwapShadowSchemaTest(unittest.TestCase):
+
+    # What mysql -N -B prints for the live schema: v1 selects from v2, and the trigger body spans lines
+    LIVE = {
+        "SHOW CREATE VIEW": [
+            ["v1", "CREATE VIEW `v1` AS select `live`.`v2`.`id` AS `id` from `live`.`v2`", "utf8mb4", "utf8mb4_general_ci"],
+            ["v2", "CREATE VIEW `v2` AS select `live`.`a`.`id` AS `id` from `live`.`a`", "utf8mb4", "utf8mb4_general_ci"],
+        ],
+        "SHOW CREATE TRIGGER": [
+            ["a_bi", "STRICT_TRANS_TABLES", "CREATE TRIGGER `a_bi` BEFORE INSERT ON `a` FOR EACH ROW BEGIN\\n"
+             "  -- it's old\\n  SET NEW.note = 'x\\\\y';\\nEND", "utf8mb4", "utf8mb4_general_ci", "utf8mb4_general_ci", ""],
+        ],
+    }
+
+    def query_rows(self, log, user, pwd, host, sql, fatal=True):
+        self.queries.append(sql)
+        if sql.startswith("SELECT TRIGGER_NAME"):
+            return [["a_bi", "a"]]
+        for prefix, rows in self.LIVE.items():
+            if sql.startswith(prefix):
+                return rows
+        if "RENAME TABLE" in sql:
+            return None
+        return []
+
+    def schema_objects(self, log, user, pwd, host, db_name, table_type):
+        if db_name == "live" and table_type == "VIEW":
+            return ["v1", "v2"]
+        return ["a"]
+
+    def replay_statements(self, log, name, statements, user, pwd, host, db):
+        self.replayed.extend((bytes(stmt).decode(), delim) for stmt, delim in statements)
+        return True
+
+    def test_failed_rename_restores_original_views_and_triggers(self):
+        self.queries, self.replayed = [], []
+        replay_objects = mock.Mock()
+        with mock.patch.object(bi, "query_rows", self.query_rows), \
+                mock.patch.object(bi, "schema_objects", self.schema_objects), \
+                mock.patch.object(bi, "replay_statements", self.replay_statements), \
+                mock.patch.object(bi, "count_rows", return_value={"a": 1}), \
+                mock.patch.object(bi, "stop_service"), mock.patch.object(bi, "start_service") as start_service:
+            with self.assertRaises(SystemExit):
+                bi.swap_shadow_schema(LOG, "u", "p", "h", "live", "live_shadow", replay_objects, "reports")
+
+        replay_objects.assert_not_called()
+        start_service.assert_called_once()
+        self.assertIn("DROP VIEW `live`.`v1`", self.queries[-1])
+        created = [stmt for stmt, _ in self.replayed if stmt.startswith("CREATE")]
+        self.assertEqual([stmt.split("`")[1] for stmt in created], ["v2", "v1", "a_bi"])
+        self.assertIn(("SET SESSION sql_mode = 'STRICT_TRANS_TABLES';", ";"), self.replayed)
+        self.assertIn(("CREATE TRIGGER `a_bi` BEFORE INSERT ON `a` FOR EACH ROW BEGIN\n"
+                       "  -- it's old\n  SET NEW.note = 'x\\y';\nEND", ";;"), self.replayed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Block-reserving allocator for custom form record ids.
+
+Record ids are taken from the RECORD_ID_SEQ row of dyextn_id_seq, the same
+sequence OpenSpecimen itself uses. Instead of scanning max(record_id) for
+every chunk or row, the allocator reserves a block of ids with a locked
+read-update of the sequence row and hands them out locally. Loaders running
+in parallel each reserve their own blocks, so they never collide.
+
+Ids left over in a block when a script exits are simply skipped.
+"""
+import threading
+
+SEQUENCE_TABLE = 'RECORD_ID_SEQ'
+DEFAULT_BLOCK_SIZE = 1000
+
+def first_value(row):
+    """Return the first column of a row from either a tuple or a dictionary cursor."""
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return next(iter(row.values()))
+    return row[0]
+
+class RecordIdAllocator:
+    """
+    Hand out record ids from blocks reserved in dyextn_id_seq.
+
+    The allocator commits on the connection it is given whenever it reserves
+    a block, so it should be called outside of the caller's own transaction
+    (or be given a dedicated connection).
+    """
+
+    def __init__(self, conn, block_size=DEFAULT_BLOCK_SIZE, sequence=SEQUENCE_TABLE, reconcile=True):
+        self.conn = conn
+        self.block_size = block_size
+        self.sequence = sequence
+        self.next_id = 0
+        self.last_id = -1
+        self.lock = threading.Lock()
+        if reconcile:
+            self.reconcile()
+
+    def reconcile(self):
+        """
+        Move the sequence past max(record_id) if something inserted records without
+        updating it, and drop the local block. This is the only place the record
+        table is scanned; call it again after a duplicate key error.
+        """
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("SELECT LAST_ID FROM dyextn_id_seq WHERE TABLE_NAME = %s FOR UPDATE", (self.sequence,))
+                last_id = first_value(cursor.fetchone())
+                cursor.execute("SELECT IFNULL(MAX(record_id), 0) FROM catissue_form_record_entry")
+                max_record_id = first_value(cursor.fetchone())
+
+                if last_id is None:
+                    cursor.execute("INSERT INTO dyextn_id_seq (TABLE_NAME, LAST_ID) VALUES (%s, %s)",
+                                   (self.sequence, max_record_id))
+                elif max_record_id > last_id:
+                    cursor.execute("UPDATE dyextn_id_seq SET LAST_ID = %s WHERE TABLE_NAME = %s",
+                                   (max_record_id, self.sequence))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+            self.next_id = 0
+            self.last_id = -1
+
+    def reserve_block(self, size):
+        """Atomically reserve size ids in dyextn_id_seq and return the first one."""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT LAST_ID FROM dyextn_id_seq WHERE TABLE_NAME = %s FOR UPDATE", (self.sequence,))
+            last_id = first_value(cursor.fetchone())
+            if last_id is None:
+                raise RuntimeError(f"Sequence {self.sequence} is missing from dyextn_id_seq")
+
+            cursor.execute("UPDATE dyextn_id_seq SET LAST_ID = %s WHERE TABLE_NAME = %s",
+                           (last_id + size, self.sequence))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return last_id + 1
+
+    def next_ids(self, count):
+        """Return a list of count unused record ids, reserving new blocks as needed."""
+        ids = []
+        with self.lock:
+            while len(ids) < count:
+                if self.next_id > self.last_id:
+                    size = max(self.block_size, count - len(ids))
+                    self.next_id = self.reserve_block(size)
+                    self.last_id = self.next_id + size - 1
+
+                take = min(count - len(ids), self.last_id - self.next_id + 1)
+                ids.extend(range(self.next_id, self.next_id + take))
+                self.next_id += take
+        return ids
+
+    def next_record_id(self):
+        """Return a single unused record id."""
+        return self.next_ids(1)[0]
@@ -0,0 +1,100 @@
+"""
+Split a CSV report into size-limited, compressed email attachments, shared by the
+report mailers.
+
+Every part is a complete CSV that repeats the header, so each attachment can be
+opened on its own. Parts are streamed to disk row by row, and the mailers read
+one part at a time when they send it.
+"""
+import csv
+import gzip
+import io
+import os
+import zipfile
+
+# compression: (file suffix, MIME main type, MIME subtype)
+ATTACHMENT_TYPES = {
+    'gzip': ('.gz', 'application', 'gzip'),
+    'zip': ('.zip', 'application', 'zip'),
+    'none': ('', 'text', 'csv'),
+}
+
+# Compressors hold back some output, so a part is closed this far below the
+# size limit. Smaller limits than MIN_PART_BYTES cannot be kept to.
+SIZE_MARGIN = 256 * 1024
+MIN_PART_BYTES = 2 * SIZE_MARGIN
+
+class ReportPart:
+    """One attachment file of a split report, written as a complete CSV with the header."""
+
+    def __init__(self, path, csv_name, compression):
+        self.path = path
+        self.rows = 0
+        self.raw = open(path, 'wb')
+        self.archive = None
+        if compression == 'gzip':
+            self.stream = gzip.GzipFile(filename=csv_name, mode='wb', fileobj=self.raw)
+        elif compression == 'zip':
+            self.archive = zipfile.ZipFile(self.raw, mode='w', compression=zipfile.ZIP_DEFLATED)
+            self.stream = self.archive.open(csv_name, mode='w', force_zip64=True)
+        else:
+            self.stream = self.raw
+        self.text = io.TextIOWrapper(self.stream, encoding='utf-8', newline='')
+
+    def size(self):
+        # Flushing the text or gzip layers would force a sync flush and hurt
+        # compression; what they still buffer is covered by SIZE_MARGIN.
+        return self.raw.tell()
+
+    def close(self):
+        self.text.close()
+        if self.archive is not None:
+            self.archive.close()
+        self.raw.close()
+
+def package_report(file_path, compression='gzip', max_bytes=None, quoting=csv.QUOTE_MINIMAL):
+    """
+    Stream the CSV report into compressed attachments of at most about max_bytes
+    each. Returns a list of (path, row count), numbered ..._partN when the report
+    is split; a report that fits in one attachment keeps the name of the CSV.
+    """
+    if max_bytes and max_bytes < MIN_PART_BYTES:
+        raise ValueError(f"attachment size limit must be at least {MIN_PART_BYTES // 1024} KB")
+    suffix = ATTACHMENT_TYPES[compression][0]
+    stem, ext = os.path.splitext(file_path)
+
+    def part_names(number):
+        name = f"{stem}_part{number}{ext}" if number else file_path
+        return name + suffix, os.path.basename(name)
+
+    parts = []
+    with open(file_path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return []
+
+        part = None
+        writer = None
+        for row in reader:
+            if part is None or (max_bytes and part.rows and part.size() >= max_bytes - SIZE_MARGIN):
+                if part is not None:
+                    part.close()
+                part = ReportPart(*part_names(len(parts) + 1), compression=compression)
+                parts.append(part)
+                writer = csv.writer(part.text, quoting=quoting)
+                writer.writerow(header)
+            writer.writerow(row)
+            part.rows += 1
+
+        if part is None:
+            part = ReportPart(*part_names(1), compression=compression)
+            parts.append(part)
+            csv.writer(part.text, quoting=quoting).writerow(header)
+        part.close()
+
+    if len(parts) == 1:
+        single, _ = part_names(0)
+        os.replace(parts[0].path, single)
+        parts[0].path = single
+    return [(part.path, part.rows) for part in parts]
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import argparse
 import csv
 import ssl
@@ -13,35 +14,52 @@ from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 
-def sendEmail(subject, body, senderEmail, receiverEmail, emailPassword, attachment):
-    message = MIMEMultipart("mixed")
-    message["Subject"] = subject
-    message["From"] = senderEmail
-    message["To"] = receiverEmail
-
-    part = MIMEText(body, "html")
-    message.attach(part)
+# The attachment splitter is shared with the other report mailers at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from reportAttachments import ATTACHMENT_TYPES, MIN_PART_BYTES, package_report
 
+def sendEmail(subject, body, senderEmail, receiverEmail, emailPassword, attachment,
+              compression='gzip', max_bytes=None):
     try:
-        with open(attachment, "rb") as file:
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(file.read())
-            encoders.encode_base64(part)
-            part.add_header(
-                "Content-Disposition",
-                f"attachment; filename={os.path.basename(attachment)}",
-            )
-            message.attach(part)
+        parts = package_report(attachment, compression, max_bytes)
     except Exception as e:
         print(f"Failed to attach file: {e}")
+        parts = []
 
+    _, maintype, subtype = ATTACHMENT_TYPES[compression]
+    total_rows = sum(rows for _, rows in parts)
     context = ssl._create_unverified_context()
 
     try:
         with smtplib.SMTP("smtp.gmail.com", 587) as server:
             server.starttls(context=context)
             server.login(senderEmail, emailPassword)
-            server.sendmail(senderEmail, receiverEmail, message.as_string())
+
+            # Only the part being sent is read into memory
+            for number, (part_path, rows) in enumerate(parts or [(None, 0)], start=1):
+                message = MIMEMultipart("mixed")
+                message["Subject"] = subject if len(parts) <= 1 else f"{subject} (part {number} of {len(parts)})"
+                message["From"] = senderEmail
+                message["To"] = receiverEmail
+
+                counts = f"<p>The report lists {total_rows} barcodes."
+                if len(parts) > 1:
+                    counts += f" It is split into {len(parts)} emails; this part has {rows} of them."
+                part = MIMEText(body.replace("</body>", counts + "</p>\n</body>", 1), "html")
+                message.attach(part)
+
+                if part_path:
+                    with open(part_path, "rb") as file:
+                        part = MIMEBase(maintype, subtype)
+                        part.set_payload(file.read())
+                        encoders.encode_base64(part)
+                        part.add_header(
+                            "Content-Disposition",
+                            f"attachment; filename={os.path.basename(part_path)}",
+                        )
+                        message.attach(part)
+
+                server.sendmail(senderEmail, receiverEmail, message.as_string())
             print("Email sent successfully!")
     except Exception as e:
         print(f"Failed to send email: {e}")
@@ -112,6 +130,15 @@ def read_config(config_file):
         db_config['PORT'] = int(db_config.get('PORT', '3306').strip())
     except ValueError:
         raise ValueError("PORT value must be an integer.")
+    db_config['ATTACHMENT_COMPRESSION'] = db_config.get('ATTACHMENT_COMPRESSION', 'gzip').lower() or 'gzip'
+    if db_config['ATTACHMENT_COMPRESSION'] not in ATTACHMENT_TYPES:
+        raise ValueError(f"ATTACHMENT_COMPRESSION must be one of {', '.join(ATTACHMENT_TYPES)}.")
+    try:
+        db_config['ATTACHMENT_MAX_MB'] = float(db_config.get('ATTACHMENT_MAX_MB', '0') or 0)
+    except ValueError:
+        raise ValueError("ATTACHMENT_MAX_MB value must be a number.")
+    if 0 < db_config['ATTACHMENT_MAX_MB'] * 1024 * 1024 < MIN_PART_BYTES:
+        raise ValueError(f"ATTACHMENT_MAX_MB must be 0 (no limit) or at least {MIN_PART_BYTES / (1024 * 1024)}.")
     return db_config
 
 def main():
@@ -150,7 +177,10 @@ def main():
             receiverEmail = db_config['RECEIVER_EMAIL']
             emailPassword = db_config['EMAIL_PASSWORD']
 
-            sendEmail(subject, body, senderEmail, receiverEmail, emailPassword, output_file)
+            maxBytes = int(db_config['ATTACHMENT_MAX_MB'] * 1024 * 1024) or None
+
+            sendEmail(subject, body, senderEmail, receiverEmail, emailPassword, output_file,
+                      db_config['ATTACHMENT_COMPRESSION'], maxBytes)
     except ValueError as ve:
         print(f"Configuration error: {ve}")
     except Exception as e:
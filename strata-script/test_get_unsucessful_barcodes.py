@@ -0,0 +1,88 @@
+import csv
+import email
+import gzip
+import io
+import os
+import shutil
+import smtplib
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+from aiosmtpd.controller import Controller
+
+import get_unsucessful_barcodes as report
+
+BODY = "<html><body><p>Hello,</p></body></html>"
+
+class Inbox:
+    """aiosmtpd handler keeping every message it receives."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return "250 OK"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class SendEmailTest(unittest.TestCase):
+
+    def setUp(self):
+        self.inbox = Inbox()
+        self.smtpd = Controller(self.inbox, hostname="127.0.0.1", port=free_port())
+        self.smtpd.start()
+        self.tmp = tempfile.mkdtemp()
+        self.report_file = os.path.join(self.tmp, "unsuccessful_barcodes.csv")
+        self.barcodes = [[f"2024-01-01 00:{i % 60:02d}:00", f"BC-{i:06d}-{os.urandom(6).hex()}"] for i in range(100000)]
+        with open(self.report_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Receive Time", "No specimens with these barcodes"])
+            writer.writerows(self.barcodes)
+
+    def tearDown(self):
+        self.smtpd.stop()
+        shutil.rmtree(self.tmp)
+
+    def send(self, max_bytes):
+        # The script always talks to Gmail with STARTTLS and a login; point it at the local server instead
+        smtp = smtplib.SMTP
+        local_smtp = lambda host, port: smtp(self.smtpd.hostname, self.smtpd.port)
+        with mock.patch.object(smtp, "starttls"), mock.patch.object(smtp, "login"), \
+                mock.patch.object(report.smtplib, "SMTP", local_smtp):
+            report.sendEmail("Missing barcodes", BODY, "from@example.org", "to@example.org", "secret",
+                             self.report_file, "gzip", max_bytes)
+        return self.inbox.messages
+
+    def attached_rows(self, message):
+        attachment = [part for part in message.walk() if part.get_filename()][0]
+        text = gzip.decompress(attachment.get_payload(decode=True)).decode("utf-8")
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], ["Receive Time", "No specimens with these barcodes"])
+        return rows[1:]
+
+    def test_report_split_into_one_email_per_part(self):
+        messages = self.send(max_bytes=report.MIN_PART_BYTES)
+        self.assertGreater(len(messages), 1)
+        rows = []
+        for number, message in enumerate(messages, start=1):
+            self.assertEqual(message["Subject"], f"Missing barcodes (part {number} of {len(messages)})")
+            attachment = [part for part in message.walk() if part.get_filename()][0]
+            self.assertLessEqual(len(attachment.get_payload(decode=True)), report.MIN_PART_BYTES)
+            rows.extend(self.attached_rows(message))
+        self.assertEqual(rows, self.barcodes)
+
+    def test_small_report_sent_as_one_email(self):
+        messages = self.send(max_bytes=None)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]["Subject"], "Missing barcodes")
+        self.assertEqual(messages[0].get_payload()[1].get_filename(), "unsuccessful_barcodes.csv.gz")
+        self.assertEqual(self.attached_rows(messages[0]), self.barcodes)
+
+if __name__ == "__main__":
+    unittest.main()
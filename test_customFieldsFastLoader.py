@@ -0,0 +1,125 @@
+import csv
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import unittest
+
+# The loader logs to a fixed file path; give the root logger a handler first so importing it does not open that file
+logging.basicConfig(handlers=[logging.NullHandler()])
+
+import customFieldsFastLoader as loader
+
+class CheckpointResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.tmp, "input.csv")
+        self.checkpoint_file = os.path.join(self.tmp, "input.csv.checkpoint")
+        with open(self.input_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(loader.REQUIRED_COLUMNS)
+            for i in range(100):
+                writer.writerow([f"CP-{i % 3}", f"SPMN-{i:04d}", f"Container {i % 5}"])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read(self, checkpoint, chunk_size=10, csv_engine="pandas", csv_block_size=loader.DEFAULT_ARROW_BLOCK_SIZE):
+        """Run the reader stage and return the (chunk id, end offset, frame) items it queued."""
+        chunk_queue = queue.Queue()
+        loader.read_chunks(self.input_file, chunk_size, csv_engine, csv_block_size, chunk_queue, checkpoint,
+                           threading.Event())
+        return list(chunk_queue.queue)
+
+    def layout(self, chunk_size=10, csv_engine="pandas", csv_block_size=loader.DEFAULT_ARROW_BLOCK_SIZE):
+        return {'chunk_size': chunk_size, 'csv_engine': csv_engine, 'csv_block_size': csv_block_size}
+
+    def test_out_of_order_commits_are_not_loaded_again(self):
+        inserted = []
+
+        # First run: writers commit chunks 1, 3, 4 and 7 out of order, then the load dies
+        checkpoint = loader.LoadCheckpoint(self.checkpoint_file, self.input_file, layout=self.layout())
+        chunks = self.read(checkpoint)
+        self.assertEqual(len(chunks), 10)
+        for chunk_id, end_offset, frame in chunks:
+            if chunk_id in (7, 3, 1, 4):
+                inserted.extend(frame["Specimen Label"])
+                checkpoint.chunk_done(chunk_id, end_offset)
+        self.assertEqual(checkpoint.chunk_id, 1)
+
+        # Second run resumes after chunk 1 and must only hand out the chunks never committed
+        resumed = loader.LoadCheckpoint.load(self.checkpoint_file, self.input_file, self.layout())
+        chunks = self.read(resumed)
+        self.assertEqual([chunk_id for chunk_id, _, _ in chunks], [2, 5, 6, 8, 9, 10])
+        for chunk_id, end_offset, frame in reversed(chunks):
+            inserted.extend(frame["Specimen Label"])
+            resumed.chunk_done(chunk_id, end_offset)
+
+        self.assertEqual(sorted(inserted), [f"SPMN-{i:04d}" for i in range(100)])
+        self.assertEqual(resumed.chunk_id, 10)
+        self.assertEqual(resumed.offset, os.path.getsize(self.input_file))
+
+        # A third resume has nothing left to load
+        finished = loader.LoadCheckpoint.load(self.checkpoint_file, self.input_file, self.layout())
+        self.assertEqual(self.read(finished), [])
+
+    def test_pyarrow_blocks_are_cut_into_chunk_size_chunks(self):
+        # Blocks of ~700 bytes hold about 25 rows, cut into chunks of 10, 10 and ~5
+        layout = self.layout(csv_engine="pyarrow", csv_block_size=700)
+        checkpoint = loader.LoadCheckpoint(self.checkpoint_file, self.input_file, layout=layout)
+        chunks = self.read(checkpoint, csv_engine="pyarrow", csv_block_size=700)
+        self.assertTrue(all(len(frame) <= 10 for _, _, frame in chunks))
+        labels = [label for _, _, frame in chunks for label in frame["Specimen Label"]]
+        self.assertEqual(labels, [f"SPMN-{i:04d}" for i in range(100)])
+        self.assertIsNone(chunks[0][1])
+
+        # Finishing only the middle of a block keeps the resume point at the block start
+        inserted = []
+        for chunk_id, end_offset, frame in chunks[:4]:
+            if chunk_id != 1:
+                inserted.extend(frame["Specimen Label"])
+                checkpoint.chunk_done(chunk_id, end_offset)
+        self.assertEqual((checkpoint.chunk_id, checkpoint.offset), (0, 0))
+
+        resumed = loader.LoadCheckpoint.load(self.checkpoint_file, self.input_file, layout)
+        for chunk_id, end_offset, frame in self.read(resumed, csv_engine="pyarrow", csv_block_size=700):
+            inserted.extend(frame["Specimen Label"])
+            resumed.chunk_done(chunk_id, end_offset)
+        self.assertEqual(sorted(inserted), [f"SPMN-{i:04d}" for i in range(100)])
+        self.assertEqual(resumed.offset, os.path.getsize(self.input_file))
+
+        # Committing a later chunk out of order must not shift the block edges on resume,
+        # or the saved chunk ids would point at other rows
+        layout = self.layout(csv_engine="pyarrow", csv_block_size=713)
+        chunks = self.read(loader.LoadCheckpoint(self.checkpoint_file, self.input_file, layout=layout),
+                           csv_engine="pyarrow", csv_block_size=713)
+        first_block = next(i for i, (_, end_offset, _) in enumerate(chunks) if end_offset is not None) + 1
+        self.assertLess(first_block, len(chunks) - 1)
+
+        for later in chunks[first_block:]:
+            if os.path.exists(self.checkpoint_file):
+                os.remove(self.checkpoint_file)
+            checkpoint = loader.LoadCheckpoint(self.checkpoint_file, self.input_file, layout=layout)
+            inserted = []
+            for chunk_id, end_offset, frame in chunks[:first_block] + [later]:
+                inserted.extend(frame["Specimen Label"])
+                checkpoint.chunk_done(chunk_id, end_offset)
+
+            resumed = loader.LoadCheckpoint.load(self.checkpoint_file, self.input_file, layout)
+            for chunk_id, end_offset, frame in self.read(resumed, csv_engine="pyarrow", csv_block_size=713):
+                inserted.extend(frame["Specimen Label"])
+                resumed.chunk_done(chunk_id, end_offset)
+            self.assertEqual(sorted(inserted), [f"SPMN-{i:04d}" for i in range(100)], f"chunk {later[0]} committed early")
+
+    def test_resume_with_another_layout_is_refused(self):
+        checkpoint = loader.LoadCheckpoint(self.checkpoint_file, self.input_file, layout=self.layout())
+        chunks = self.read(checkpoint)
+        checkpoint.chunk_done(chunks[2][0], chunks[2][1])
+        with self.assertRaises(ValueError):
+            loader.LoadCheckpoint.load(self.checkpoint_file, self.input_file, self.layout(chunk_size=20))
+
+if __name__ == "__main__":
+    unittest.main()
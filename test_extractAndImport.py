@@ -0,0 +1,40 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import extractAndImport
+
+class InspectBackupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "backup.sql.gz")
+        self.tables = [f"table_{i}" for i in range(3000)]
+        # Stored (level 0) so that reads cut the dump at arbitrary places
+        with gzip.open(self.path, "wb", compresslevel=0) as f:
+            for table in self.tables:
+                f.write(f"DROP TABLE IF EXISTS `{table}`;\nCREATE TABLE `{table}` (`id` int);\n"
+                        f"INSERT INTO `{table}` VALUES (1),(2);\n".encode())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_drop_lines_split_across_reads_are_listed_once(self):
+        for read_size in (97, 1000, extractAndImport.READ_SIZE):
+            with mock.patch.object(extractAndImport, "READ_SIZE", read_size):
+                _, tables = extractAndImport.inspect_backup(self.path)
+            self.assertEqual(tables, self.tables, f"READ_SIZE={read_size}")
+
+    def test_truncated_archive_is_rejected(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with open(self.path, "wb") as f:
+            f.write(data[:len(data) // 2])
+        with self.assertRaises(ValueError):
+            extractAndImport.inspect_backup(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
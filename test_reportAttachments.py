@@ -0,0 +1,56 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from reportAttachments import MIN_PART_BYTES, package_report
+
+class PackageReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.report_file = os.path.join(self.tmp, "report.csv")
+        self.rows = [[str(i), f"value {i} {os.urandom(8).hex()}"] for i in range(100000)]
+        with open(self.report_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "value"])
+            writer.writerows(self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_zip_parts_hold_one_complete_csv_each(self):
+        parts = package_report(self.report_file, "zip", MIN_PART_BYTES)
+        self.assertGreater(len(parts), 1)
+        rows = []
+        for number, (path, count) in enumerate(parts, start=1):
+            self.assertEqual(os.path.basename(path), f"report_part{number}.csv.zip")
+            self.assertLessEqual(os.path.getsize(path), MIN_PART_BYTES)
+            with zipfile.ZipFile(path) as archive:
+                self.assertEqual(archive.namelist(), [f"report_part{number}.csv"])
+                part_rows = list(csv.reader(io.StringIO(archive.read(archive.namelist()[0]).decode("utf-8"))))
+            self.assertEqual(part_rows[0], ["id", "value"])
+            self.assertEqual(len(part_rows) - 1, count)
+            rows.extend(part_rows[1:])
+        self.assertEqual(rows, self.rows)
+
+    def test_uncompressed_report_that_fits_keeps_its_name(self):
+        self.assertEqual(package_report(self.report_file, "none"), [(self.report_file, 100000)])
+        with open(self.report_file, newline="") as f:
+            self.assertEqual(list(csv.reader(f))[1:], self.rows)
+
+    def test_header_only_report_is_one_empty_part(self):
+        with open(self.report_file, "w", newline="") as f:
+            csv.writer(f).writerow(["id", "value"])
+        self.assertEqual(package_report(self.report_file, "gzip", MIN_PART_BYTES), [(self.report_file + ".gz", 0)])
+
+    def test_limit_below_the_margin_is_refused(self):
+        with self.assertRaises(ValueError):
+            package_report(self.report_file, "gzip", MIN_PART_BYTES - 1)
+        self.assertFalse(os.path.exists(self.report_file + ".gz"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,14 +4,12 @@ import mysql.connector
 from mysql.connector import Error
 from datetime import datetime
 import csv
+from formLookups import build_reverse_index, lookup
+from recordIdAllocator import RecordIdAllocator, DEFAULT_BLOCK_SIZE
 
-def create_new_custom_field_record(conn, cursor, form_context_map, user_id, object_id, cp_id, targetTableName, reason):
-    reversed_form_context_map = {v: k for k, v in form_context_map.items()}
-    form_context_id = reversed_form_context_map.get(cp_id)
-    get_max_record_id_query = f""" select max(record_id) + 1 from catissue_form_record_entry;"""
-    cursor.execute(get_max_record_id_query)
-    get_max_record_id = cursor.fetchone()
-    new_record_id = get_max_record_id['max(record_id) + 1'] if get_max_record_id and get_max_record_id['max(record_id) + 1'] else 1 
+def create_new_custom_field_record(conn, cursor, form_context_index, record_ids, user_id, object_id, cp_id, targetTableName, reason):
+    form_context_id = lookup(form_context_index, cp_id)
+    new_record_id = record_ids.next_record_id()
 
     insert_into_record_entry = f"""
     INSERT INTO catissue_form_record_entry (FORM_CTXT_ID, OBJECT_ID, RECORD_ID, UPDATED_BY, UPDATE_TIME, ACTIVITY_STATUS, FORM_STATUS, OLD_OBJECT_ID) 
@@ -23,12 +21,9 @@ def create_new_custom_field_record(conn, cursor, form_context_map, user_id, obje
     VALUES(%s, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, %s, NULL, NULL); 
     """
     
-    reset_record_id_seq = f"UPDATE dyextn_id_seq SET LAST_ID = {new_record_id} WHERE TABLE_NAME = 'RECORD_ID_SEQ';"
-    
     try:
         cursor.execute(insert_into_record_entry, (form_context_id, object_id, new_record_id, user_id))
         cursor.execute(insert_de_query, (new_record_id, reason))
-        cursor.execute(reset_record_id_seq)
         conn.commit()  # Commit the transaction
         print(f"Inserted new custom field record for specimen_id: {object_id}")
     except Exception as e:
@@ -45,7 +40,7 @@ def update_existing_custom_field(conn, cursor, reason, targetTableName, targetCo
         print(f"Error: updating record for disposal event ID {custom_field_record_id}: {e}")
 
 def update_else_create_custom_record(conn, cursor, cpg_id, disposedFormId, user_id, targetEntityType, targetTableName, 
-                                    targetColumnName, targetCustomFormId, form_context_map, disposalEventIds):
+                                    targetColumnName, targetCustomFormId, form_context_index, record_ids, disposalEventIds):
     with open(disposalEventIds, 'r') as file:
         # Get the current timestamp
         reader = csv.reader(file)
@@ -104,7 +99,7 @@ def update_else_create_custom_record(conn, cursor, cpg_id, disposedFormId, user_
                             update_existing_custom_field(conn, cursor, custom_field_value, targetTableName, targetColumnName, custom_field_record_id)
                         elif custom_field_record_exist is None:
                             # Create new record
-                            create_new_custom_field_record(conn, cursor, form_context_map, user_id, specimen_id, result['collection_protocol_id'], targetTableName, custom_field_value)
+                            create_new_custom_field_record(conn, cursor, form_context_index, record_ids, user_id, specimen_id, result['collection_protocol_id'], targetTableName, custom_field_value)
                 else:
                     print(f"The disposal event is not present for: {disposal_event_id} - IGNORING")
                 
@@ -112,7 +107,7 @@ def update_else_create_custom_record(conn, cursor, cpg_id, disposedFormId, user_
                 print(f"Error executing query for ID {disposal_event_id}: {e}")
 
 def get_form_context(cursor, container_id, group_id):
-    """Fetch form context details and store them in a dictionary."""
+    """Fetch form contexts as a {normalized CP id: form context id} index."""
     query = """
     SELECT ctxt.identifier as 'form_context_id', ctxt.cp_id as 'cp_id'
     FROM catissue_form_context ctxt, catissue_collection_protocol cp, os_cp_group_cps cpg
@@ -121,8 +116,7 @@ def get_form_context(cursor, container_id, group_id):
     cursor.execute(query, (group_id, container_id))
     results = cursor.fetchall()
 
-    form_context_map = {row['form_context_id']: row['cp_id'] for row in results}
-    return form_context_map
+    return build_reverse_index(results, 'form_context_id', 'cp_id')
 
 def main():
     """Main function to perform the update in batches."""
@@ -150,18 +144,22 @@ def main():
     targetColumnName = config['mysql']['targetColumnName']
     targetCustomFormId = config['mysql']['targetCustomFormId']
     disposalEventIds = config['mysql']['disposalEventIds']
+    record_id_block_size = config['mysql'].getint('record_id_block_size', fallback=DEFAULT_BLOCK_SIZE)
 
     try:
         # Connect to the database
         conn = mysql.connector.connect(**db_config)
         cursor = conn.cursor(dictionary=True)
         
-        # Get Form Context and store in a map
-        form_context_map = get_form_context(cursor, targetCustomFormId, cpg_id)
-        print("Form Context:", form_context_map)
+        # Get Form Context and store in a lookup index
+        form_context_index = get_form_context(cursor, targetCustomFormId, cpg_id)
+        print("Form Context:", form_context_index)
+
+        # Reserve record ids in blocks instead of scanning max(record_id) per row
+        record_ids = RecordIdAllocator(conn, block_size=record_id_block_size)
 
         update_else_create_custom_record(conn, cursor, cpg_id, disposedFormId, user_id, targetEntityType, targetTableName,
-                                        targetColumnName, targetCustomFormId, form_context_map, disposalEventIds)
+                                        targetColumnName, targetCustomFormId, form_context_index, record_ids, disposalEventIds)
     except Error as e:
         print(f"Error: {e}")
 